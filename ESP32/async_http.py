@@ -0,0 +1,247 @@
+# async_http.py
+# Small uasyncio HTTP/1.1 client for outbound requests from the event loop.
+#
+# Connections are kept alive and pooled per (host, port, tls), so a burst of
+# requests to one API pays for one TCP connect and TLS handshake. Host names
+# are resolved once and cached; bodies are streamed, with chunked transfer
+# decoding, and every request has one deadline covering connect to last byte.
+import socket
+import time
+import uasyncio as asyncio
+
+MAX_HEADER_LINE = 512
+MAX_HEADERS = 32
+
+class HttpClientError(Exception):
+    pass
+
+def split_url(url):
+    """(use_tls, host, port, path) for an http(s) URL."""
+    scheme, _, rest = url.partition("://")
+    if scheme not in ("http", "https"):
+        raise HttpClientError(f"unsupported URL {url}")
+    host, slash, path = rest.partition("/")
+    tls = scheme == "https"
+    port = 443 if tls else 80
+    if ":" in host:
+        host, port = host.split(":", 1)
+        port = int(port)
+    return tls, host, port, slash + path if slash else "/"
+
+def _remaining_s(deadline):
+    remaining = time.ticks_diff(deadline, time.ticks_ms())
+    if remaining <= 0:
+        raise asyncio.TimeoutError
+    return remaining / 1000
+
+class Connection:
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = time.ticks_ms()
+        self.reused = False
+
+    def close(self):
+        try:
+            self.writer.close()
+        except OSError:
+            pass
+
+class Response:
+    """Status and headers of a response; the body is either read into body or streamed with read()."""
+    def __init__(self, client, conn, status, headers, deadline):
+        self.client = client
+        self.conn = conn
+        self.status = status
+        self.headers = headers
+        self.body = None
+        self.deadline = deadline
+        self.chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        length = headers.get("content-length")
+        self.remaining = int(length) if length is not None and not self.chunked else None
+        self.chunk_left = 0
+        self.done = self.remaining == 0
+        # Without a length or chunking the body ends when the server closes
+        self.reusable = (self.chunked or self.remaining is not None) and \
+            headers.get("connection", "").lower() != "close"
+
+    async def _line(self):
+        line = await asyncio.wait_for(self.conn.reader.readline(), _remaining_s(self.deadline))
+        if not line:
+            raise HttpClientError("connection closed mid-body")
+        return line
+
+    async def read(self, n=512):
+        """Next chunk of the body, b"" at the end; the request deadline still applies."""
+        if self.done or self.conn is None:
+            return b""
+        if self.chunked and self.chunk_left == 0:
+            try:
+                size = int(bytes(await self._line()).split(b";")[0].strip(), 16)
+            except ValueError:
+                raise HttpClientError("bad chunk size")
+            if size == 0:
+                while (await self._line()) not in (b"\r\n", b"\n"):
+                    pass  # trailers
+                self.done = True
+                return b""
+            self.chunk_left = size
+        if self.chunked:
+            n = min(n, self.chunk_left)
+        elif self.remaining is not None:
+            n = min(n, self.remaining)
+        data = await asyncio.wait_for(self.conn.reader.read(n), _remaining_s(self.deadline))
+        if not data:
+            if self.remaining is None and not self.chunked:
+                self.done = True
+                return b""
+            raise HttpClientError("connection closed mid-body")
+        if self.chunked:
+            self.chunk_left -= len(data)
+            if self.chunk_left == 0:
+                await self._line()  # CRLF after the chunk data
+        elif self.remaining is not None:
+            self.remaining -= len(data)
+            self.done = self.remaining == 0
+        return data
+
+    async def close(self):
+        """Hand the connection back to the pool if the body was read to the end, else drop it."""
+        conn, self.conn = self.conn, None
+        if conn:
+            if self.done and self.reusable:
+                self.client._release(conn)
+            else:
+                conn.close()
+
+class HttpClient:
+    def __init__(self, max_idle_per_host=2, idle_timeout_s=30, dns_ttl_s=3600):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout_ms = idle_timeout_s * 1000
+        self.dns_ttl_ms = dns_ttl_s * 1000
+        self.pool = {}  # (host, port, tls) -> [Connection, ...]
+        self.dns = {}   # host -> (address, resolved at ticks_ms)
+        self.connects = 0
+        self.requests = 0
+
+    def resolve(self, host, port):
+        """Cached address for host; getaddrinfo blocks, so it is only called once per TTL."""
+        entry = self.dns.get(host)
+        if entry and time.ticks_diff(time.ticks_ms(), entry[1]) < self.dns_ttl_ms:
+            return entry[0]
+        address = socket.getaddrinfo(host, port)[0][-1][0]
+        self.dns[host] = (address, time.ticks_ms())
+        return address
+
+    def _acquire(self, key):
+        idle = self.pool.get(key)
+        now = time.ticks_ms()
+        while idle:
+            conn = idle.pop()
+            if time.ticks_diff(now, conn.idle_since) < self.idle_timeout_ms:
+                conn.reused = True
+                return conn
+            conn.close()
+        return None
+
+    def _release(self, conn):
+        idle = self.pool.setdefault(conn.key, [])
+        if len(idle) >= self.max_idle_per_host:
+            conn.close()
+            return
+        conn.idle_since = time.ticks_ms()
+        idle.append(conn)
+
+    def close_idle(self):
+        """Drop every pooled connection, e.g. to give TLS buffers back after a burst."""
+        for idle in self.pool.values():
+            for conn in idle:
+                conn.close()
+        self.pool = {}
+
+    async def _connect(self, key, deadline):
+        host, port, tls = key
+        address = self.resolve(host, port)
+        if tls:
+            # Connect to the cached address but keep the name for SNI and certificates
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port, ssl=True, server_hostname=host), _remaining_s(deadline))
+        else:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), _remaining_s(deadline))
+        self.connects += 1
+        return Connection(key, reader, writer)
+
+    async def _exchange(self, conn, request, deadline):
+        conn.writer.write(request)
+        await asyncio.wait_for(conn.writer.drain(), _remaining_s(deadline))
+        reader = conn.reader
+        line = await asyncio.wait_for(reader.readline(), _remaining_s(deadline))
+        if not line:
+            return None  # a pooled connection the server already closed
+        try:
+            status = int(line.split(None, 2)[1])
+        except (IndexError, ValueError):
+            raise HttpClientError("bad status line")
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), _remaining_s(deadline))
+            if not line or line in (b"\r\n", b"\n"):
+                break
+            if len(line) > MAX_HEADER_LINE or len(headers) >= MAX_HEADERS:
+                raise HttpClientError("response headers too large")
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return Response(self, conn, status, headers, deadline)
+
+    async def stream(self, url, timeout_s=15, headers=""):
+        """GET url and return once the headers are in; read the body with read(), then close()."""
+        deadline = time.ticks_add(time.ticks_ms(), int(timeout_s * 1000))
+        tls, host, port, path = split_url(url)
+        key = (host, port, tls)
+        request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n{headers}\r\n".encode()
+        self.requests += 1
+        while True:
+            conn = self._acquire(key) or await self._connect(key, deadline)
+            try:
+                response = await self._exchange(conn, request, deadline)
+            except OSError:
+                conn.close()
+                if conn.reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if response is not None:
+                return response
+            conn.close()
+            if not conn.reused:
+                raise HttpClientError("connection closed before response")
+
+    async def get(self, url, timeout_s=15, max_body=16 * 1024, headers=""):
+        """GET url into response.body; raises HttpClientError, OSError or TimeoutError."""
+        r = await self.stream(url, timeout_s, headers)
+        try:
+            body = bytearray()
+            while True:
+                chunk = await r.read()
+                if not chunk:
+                    break
+                body.extend(chunk)
+                if len(body) > max_body:
+                    raise HttpClientError("response too large")
+            r.body = bytes(body)
+            return r
+        finally:
+            await r.close()
+
+# Shared client, so every caller draws from the same connection pool
+client = HttpClient()
+
+async def stream(url, timeout_s=15, headers=""):
+    return await client.stream(url, timeout_s, headers)
+
+async def get(url, timeout_s=15, max_body=16 * 1024, headers=""):
+    return await client.get(url, timeout_s, max_body, headers)
@@ -0,0 +1,289 @@
+# config_store.py
+# Validated, atomic settings updates with one debounced write per burst of edits.
+#
+# Values live in a backend: NvsBackend keeps each key in the ESP32 NVS
+# partition (integers as i32, everything else as a JSON blob) and writes only
+# changed keys; JsonBackend is the old whole-file format, kept for boards
+# without NVS and as the import/export format. An edited or re-uploaded JSON
+# file is imported again on the next boot; ConfigStore.export() gives it back.
+import json
+import os
+import uasyncio as asyncio
+from binascii import crc32
+
+try:
+    import esp32
+except ImportError:
+    esp32 = None
+
+_MISSING = object()
+NVS_KEY_LEN = 15  # ESP-IDF limit on NVS key names
+NVS_INDEX_KEY = "_keys"
+NVS_SOURCE_KEY = "_src"  # fingerprint of the JSON file last imported
+NVS_BLOB_MAX = 512
+
+def replace_file(tmp, path):
+    """Rename tmp over path. LittleFS replaces atomically; FAT refuses to rename
+    onto an existing file, so there the old file is removed first and
+    recover_file() covers a reset in between."""
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        os.remove(path)
+        os.rename(tmp, path)
+
+def recover_file(path):
+    """Finish a replace_file() cut short after the remove; True if path exists afterwards."""
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        pass
+    try:
+        os.rename(path + ".tmp", path)
+        return True
+    except OSError:
+        return False
+
+def write_json_atomic(path, data):
+    """Write to a temp file and rename over the original so a reset never leaves half a file."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    replace_file(tmp, path)
+
+def file_fingerprint(path):
+    """[size, crc32] of a file, or None if it cannot be read."""
+    recover_file(path)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return [len(data), crc32(data) & 0xffffffff]
+
+class JsonBackend:
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            recover_file(self.path)
+            with open(self.path) as f:
+                self._data = json.load(f)
+        return self._data
+
+    def read(self, key):
+        return self._load().get(key, _MISSING)
+
+    def keys(self):
+        return list(self._load())
+
+    def write(self, values):
+        data = self._load()
+        data.update(values)
+        write_json_atomic(self.path, data)
+
+class NvsBackend:
+    def __init__(self, namespace):
+        self.nvs = esp32.NVS(namespace)
+        self._blob = bytearray(NVS_BLOB_MAX)
+        self._keys = None
+
+    @staticmethod
+    def nvs_key(key):
+        return key[:NVS_KEY_LEN]
+
+    def _read_blob(self, key):
+        n = self.nvs.get_blob(key, self._blob)
+        return json.loads(bytes(self._blob[:n]))
+
+    def keys(self):
+        if self._keys is None:
+            try:
+                self._keys = self._read_blob(NVS_INDEX_KEY)
+            except OSError:
+                self._keys = []
+        return self._keys
+
+    def read_meta(self, key):
+        """Bookkeeping blob kept outside the settings index, or None."""
+        try:
+            return self._read_blob(key)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, key, value):
+        self.nvs.set_blob(key, json.dumps(value))
+        self.nvs.commit()
+
+    def read(self, key):
+        nkey = self.nvs_key(key)
+        try:
+            return self.nvs.get_i32(nkey)
+        except OSError:
+            pass
+        try:
+            return self._read_blob(nkey)
+        except OSError:
+            return _MISSING
+
+    def write(self, values):
+        """Set only the given keys, then one commit."""
+        keys = self.keys()
+        new_keys = False
+        for key, value in values.items():
+            nkey = self.nvs_key(key)
+            if isinstance(value, int) and not isinstance(value, bool) and -2**31 <= value < 2**31:
+                self.nvs.set_i32(nkey, value)
+            else:
+                self.nvs.set_blob(nkey, json.dumps(value))
+            if key not in keys:
+                keys.append(key)
+                new_keys = True
+        if new_keys:
+            names = [self.nvs_key(k) for k in keys]
+            if len(set(names)) != len(names):
+                raise ValueError("config keys collide in their first 15 characters")
+            self.nvs.set_blob(NVS_INDEX_KEY, json.dumps(keys))
+        self.nvs.commit()
+
+def import_json(backend, json_path, namespace, log):
+    """Copy json_path into NVS when it is new or has changed since the last import."""
+    source = file_fingerprint(json_path)
+    if source is None or source == backend.read_meta(NVS_SOURCE_KEY):
+        return
+    if backend.keys() and backend.read_meta(NVS_SOURCE_KEY) is None:
+        # Imported by a version that kept no fingerprint; the NVS values may be newer
+        backend.write_meta(NVS_SOURCE_KEY, source)
+        return
+    try:
+        imported = JsonBackend(json_path)
+        backend.write({key: imported.read(key) for key in imported.keys()})
+    except ValueError as e:
+        log(f"[WARN] Not importing {json_path}: {e}")
+        return
+    backend.write_meta(NVS_SOURCE_KEY, source)
+    log(f"[INFO] Imported {json_path} into NVS namespace {namespace}")
+
+def open_config_store(namespace, json_path, schema=None, log=print, **kwargs):
+    """NVS-backed store when available, importing json_path when it changes; else the JSON file."""
+    if esp32 is not None and hasattr(esp32, "NVS"):
+        try:
+            backend = NvsBackend(namespace)
+            import_json(backend, json_path, namespace, log)
+            if not backend.keys():
+                raise OSError(f"nothing imported from {json_path}")
+            return ConfigStore(backend, schema, log=log, **kwargs)
+        except OSError as e:
+            log(f"[WARN] NVS config unavailable, using {json_path}: {e}")
+    return ConfigStore(JsonBackend(json_path), schema, log=log, **kwargs)
+
+class ConfigStore:
+    def __init__(self, backend, schema=None, on_apply=None, log=print, debounce_ms=2000):
+        # schema: key -> (type, min, max); min/max may be None
+        self.backend = backend
+        self.schema = schema or {}
+        self.on_apply = on_apply
+        self.log = log
+        self.debounce_ms = debounce_ms
+        # Values read so far; keys are only fetched from the backend on first use
+        self.cache = {}
+        self.pending = {}
+        self.revision = 0
+        self.saves = 0
+        self._dirty = asyncio.Event()
+
+    def get(self, key, default=None):
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.backend.read(key)
+            if value is _MISSING:
+                return default
+            self.cache[key] = value
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def settings(self):
+        """Current value of every schema key."""
+        return {key: self.get(key) for key in self.schema}
+
+    def validate(self, changes):
+        """Coerced copy of changes; raises ValueError naming the first bad key."""
+        if not isinstance(changes, dict):
+            raise ValueError("expected a JSON object")
+        clean = {}
+        for key, value in changes.items():
+            rule = self.schema.get(key)
+            if rule is None:
+                raise ValueError(f"unknown setting {key}")
+            kind, low, high = rule
+            try:
+                if kind is int and isinstance(value, float) and value != int(value):
+                    raise ValueError
+                value = kind(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be {kind.__name__}")
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise ValueError(f"{key} out of range [{low}, {high}]")
+            clean[key] = value
+        return clean
+
+    def update(self, changes):
+        """Validate everything, then apply everything; nothing is applied if any key is bad.
+
+        Returns the keys that actually changed. Persisting is left to run(),
+        which coalesces bursts of updates into one write.
+        """
+        clean = self.validate(changes)
+        changed = {key: value for key, value in clean.items() if self.get(key) != value}
+        if not changed:
+            return changed
+        self.cache.update(changed)
+        self.pending.update(changed)
+        if self.on_apply:
+            self.on_apply(changed)
+        self.revision += 1
+        self._dirty.set()
+        return changed
+
+    def flush(self):
+        """Write the keys changed since the last flush, if any."""
+        if self.pending:
+            pending = self.pending
+            self.pending = {}
+            try:
+                self.backend.write(pending)
+            except Exception:
+                pending.update(self.pending)
+                self.pending = pending
+                raise
+            self.saves += 1
+
+    def export(self):
+        """Every stored key, in the JSON file format that is imported."""
+        values = {key: self.get(key) for key in self.backend.keys()}
+        values.update(self.pending)  # not yet written to the backend
+        return values
+
+    async def run(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            # Wait for the edits to go quiet so a burst costs one write
+            while True:
+                seen = self.revision
+                await asyncio.sleep_ms(self.debounce_ms)
+                if self.revision == seen:
+                    break
+            try:
+                self.flush()
+                self.log("[INFO] Settings saved")
+            except (OSError, ValueError) as e:
+                self.log(f"[ERROR] Saving settings failed: {e}")
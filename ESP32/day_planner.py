@@ -0,0 +1,82 @@
+# day_planner.py
+# Today's automation deadlines, worked out once per day from sunrise/sunset.
+#
+# The main loop evaluates the door and light rules only at these boundaries
+# (plus a capped sleep for the watchdog) instead of polling on a fixed period.
+
+DAY_SECONDS = 86_400
+DOOR_OPEN_MARGIN_S = 600      # open from 10 min before to 10 min after sunrise
+DOOR_CLOSE_START_S = 600      # close 10 to 20 min after sunset
+DOOR_CLOSE_END_S = 1200
+LIGHT_OVERLAP_S = 300         # supplement light overlaps daylight by 5 min
+
+class DayPlan:
+    """Windows and the sorted event timeline for one local day; all times in seconds since midnight."""
+    def __init__(self, sunrise, sunset, sun_seconds, failsafe_open, failsafe_close):
+        self.sunrise = sunrise
+        self.sunset = sunset
+        self.open_window = (sunrise - DOOR_OPEN_MARGIN_S, sunrise + DOOR_OPEN_MARGIN_S)
+        self.close_window = (sunset + DOOR_CLOSE_START_S, sunset + DOOR_CLOSE_END_S)
+        self.failsafe_open = failsafe_open
+        self.failsafe_close = failsafe_close
+        self.daylight_short = sunset - sunrise < sun_seconds
+        self.light_windows = ()
+        if self.daylight_short:
+            extension = (sun_seconds - (sunset - sunrise)) // 2
+            self.light_windows = ((sunrise - extension, sunrise + LIGHT_OVERLAP_S),
+                                  (sunset - LIGHT_OVERLAP_S, sunset + extension))
+        events = [
+            (self.open_window[0], "door_open"), (self.open_window[1], "door_open_end"),
+            (self.close_window[0], "door_close"), (self.close_window[1], "door_close_end"),
+            (failsafe_open, "failsafe_open"), (sunset, "failsafe_open_end"),
+            (failsafe_close, "failsafe_close"),
+        ]
+        for start, end in self.light_windows:
+            events.append((start, "light_on"))
+            events.append((end, "light_off"))
+        self.events = sorted(e for e in events if 0 <= e[0] < DAY_SECONDS)
+
+    def next_event(self, now_sec):
+        """(seconds, name) of the first event after now_sec; midnight if none is left today."""
+        for event in self.events:
+            if event[0] > now_sec:
+                return event
+        return DAY_SECONDS, "midnight"
+
+    def light_until(self, now_sec):
+        """End of the supplement window now_sec falls in, or None outside them."""
+        for start, end in self.light_windows:
+            if start <= now_sec < end:
+                return end
+        return None
+
+    def light_off_between(self, after, upto):
+        """True if a supplement window ended in (after, upto]."""
+        for _, end in self.light_windows:
+            if after < end <= upto:
+                return True
+        return False
+
+def in_window(window, now_sec):
+    return window[0] <= now_sec < window[1]
+
+class DayPlanner:
+    """Builds the DayPlan once per day and whenever its inputs change."""
+    def __init__(self, failsafe_open, failsafe_close):
+        self.failsafe_open = failsafe_open
+        self.failsafe_close = failsafe_close
+        self.plan = None
+        self.key = None
+        self.builds = 0
+
+    def today(self, mday, sun_times, sun_seconds):
+        """Plan for today, or None while sunrise or sunset is unknown."""
+        sunrise, sunset = sun_times
+        if sunrise is None or sunset is None:
+            return None
+        key = (mday, sunrise, sunset, sun_seconds)
+        if key != self.key:
+            self.key = key
+            self.plan = DayPlan(sunrise, sunset, sun_seconds, self.failsafe_open, self.failsafe_close)
+            self.builds += 1
+        return self.plan
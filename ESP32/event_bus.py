@@ -0,0 +1,67 @@
+# event_bus.py
+# Fan-out of live events (door, current, relays, log lines) to Server-Sent Events clients.
+import json
+import uasyncio as asyncio
+
+# Publishers include the motor thread, so waking a subscriber must be thread safe
+_Flag = getattr(asyncio, "ThreadSafeFlag", asyncio.Event)
+
+def format_event(event, data):
+    """SSE message bytes; a newline inside data would end the event, so each line gets its own data: field."""
+    if not isinstance(data, str):
+        data = json.dumps(data)
+    if "\n" in data or "\r" in data:
+        data = "\ndata: ".join(data.replace("\r\n", "\n").replace("\r", "\n").split("\n"))
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = []
+        self.queue_size = queue_size
+        self.dropped = False
+        self.flag = _Flag()
+
+    def put(self, message):
+        if len(self.queue) >= self.queue_size:
+            # Too slow to keep up; the stream handler sees this and disconnects
+            self.dropped = True
+        else:
+            self.queue.append(message)
+        self.flag.set()
+
+    async def wait(self):
+        await self.flag.wait()
+        if hasattr(self.flag, "clear"):
+            self.flag.clear()
+
+    def take(self):
+        messages = self.queue
+        self.queue = []
+        return messages
+
+class EventBus:
+    def __init__(self, queue_size=16, max_subscribers=4):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = []
+
+    def subscribe(self):
+        """New Subscriber, or None when the subscriber limit is reached."""
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        sub = Subscriber(self.queue_size)
+        self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        if sub in self.subscribers:
+            self.subscribers.remove(sub)
+
+    def publish(self, event, data):
+        """Format once as an SSE message and queue it for every subscriber."""
+        if not self.subscribers:
+            return
+        message = format_event(event, data)
+        for sub in self.subscribers[:]:
+            if not sub.dropped:
+                sub.put(message)
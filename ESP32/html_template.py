@@ -0,0 +1,77 @@
+# html_template.py
+# Precompiled templates: constant bytes fragments interleaved with named slots.
+#
+# A template source uses {name} for dynamic values. compile_template() splits it
+# once into a tuple like (b"<p>Door: <b>", "door", b"</b></p>"). Written out as a
+# module with freeze_template() and frozen into the firmware (or left as .mpy
+# on flash), the bytes literals stay in flash and are never rebuilt per request.
+#
+# Regenerate a page module on the host:
+#   python3 html_template.py status_page.html status_page.py
+
+class Template:
+    def __init__(self, parts):
+        self.parts = parts
+
+    def render(self, slots, ctx=None):
+        """Yield fragments; static parts as-is, slots[name](ctx) formatted on demand.
+
+        A slot may return bytes/str, any value (formatted with str()), or an
+        iterable of fragments which is streamed through unchanged.
+        """
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            value = slots[part](ctx)
+            if isinstance(value, (str, bytes)):
+                yield value
+            elif isinstance(value, (int, float, bool)) or value is None:
+                yield str(value)
+            else:
+                for fragment in value:
+                    yield fragment
+
+def compile_template(src):
+    """Split '{name}' placeholders out of src; '{{' and '}}' are literal braces."""
+    parts = []
+    static = []
+    i = 0
+    n = len(src)
+    while i < n:
+        c = src[i]
+        if c == "{" and src[i + 1:i + 2] == "{":
+            static.append("{")
+            i += 2
+        elif c == "}" and src[i + 1:i + 2] == "}":
+            static.append("}")
+            i += 2
+        elif c == "{":
+            end = src.index("}", i)
+            if static:
+                parts.append("".join(static).encode())
+                static = []
+            parts.append(src[i + 1:end].strip())
+            i = end + 1
+        else:
+            static.append(c)
+            i += 1
+    if static:
+        parts.append("".join(static).encode())
+    return tuple(parts)
+
+def freeze_template(parts, name="PARTS"):
+    """Python source for a module holding the compiled parts as literals."""
+    lines = ["# Generated by html_template.py - edit the .html source instead.", f"{name} = ("]
+    for part in parts:
+        lines.append(f"    {part!r},")
+    lines.append(")")
+    return "\n".join(lines) + "\n"
+
+if __name__ == "__main__":
+    import sys
+    with open(sys.argv[1]) as f:
+        compiled = compile_template(f.read())
+    with open(sys.argv[2], "w") as f:
+        f.write(freeze_template(compiled))
+    print(f"{len(compiled)} parts, {sum(1 for p in compiled if isinstance(p, str))} slots")
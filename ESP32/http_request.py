@@ -0,0 +1,185 @@
+# http_request.py
+# Small streaming HTTP/1.x request parser for the coop web UI.
+
+MAX_REQUEST_LINE = 512
+MAX_HEADERS = 24
+MAX_HEADER_LINE = 512
+MAX_BODY = 4096
+READ_CHUNK = 128
+_HEX = b"0123456789abcdefABCDEF"
+
+class HttpError(Exception):
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+class Request:
+    def __init__(self, method, path, query, headers, body, version="HTTP/1.0"):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.version = version
+        self._form = None
+        # HTTP/1.1 is persistent unless the client opts out; HTTP/1.0 only if it opts in.
+        # The server clears this when the connection has to close after the response.
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            self.keep_alive = connection != "close"
+        else:
+            self.keep_alive = connection == "keep-alive"
+
+    def form(self):
+        """Urlencoded POST body decoded once into a dict."""
+        if self._form is None:
+            self._form = {}
+            if self.body and self.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+                try:
+                    self._form = parse_qs(self.body)
+                except (UnicodeError, ValueError):
+                    pass  # not UTF-8: treated as an empty form
+        return self._form
+
+    def params(self):
+        """Query string and form fields together; form fields win."""
+        form = self.form()
+        if not form:
+            return self.query
+        merged = dict(self.query)
+        merged.update(form)
+        return merged
+
+class LineReader:
+    """Buffers a StreamReader so readline() can give up once a line passes its limit.
+
+    StreamReader.readline() keeps reading until it sees a newline, however long
+    the line is. Bytes read past a line are kept for the next call, so one
+    LineReader serves every request on a keep-alive connection.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.pending = b""
+
+    async def readline(self, limit):
+        """Next line including its newline; b"" at EOF; None once it would exceed limit bytes."""
+        while True:
+            i = self.pending.find(b"\n")
+            if i >= 0:
+                if i + 1 > limit:
+                    return None
+                line = self.pending[:i + 1]
+                self.pending = self.pending[i + 1:]
+                return line
+            if len(self.pending) >= limit:
+                return None
+            chunk = await self.stream.read(READ_CHUNK)
+            if not chunk:
+                line, self.pending = self.pending, b""
+                return line
+            self.pending += chunk
+
+    async def read(self, n):
+        if self.pending:
+            data = self.pending[:n]
+            self.pending = self.pending[n:]
+            return data
+        return await self.stream.read(n)
+
+def unquote_plus(s):
+    if isinstance(s, str):
+        s = s.encode()
+    if b"%" not in s and b"+" not in s:
+        return s.decode()
+    s = s.replace(b"+", b" ")
+    parts = s.split(b"%")
+    out = bytearray(parts[0])
+    for part in parts[1:]:
+        # Anything but two hex digits, including a truncated escape at the end, stays literal
+        if len(part) >= 2 and part[0] in _HEX and part[1] in _HEX:
+            out.append(int(part[:2], 16))
+            out.extend(part[2:])
+        else:
+            out.extend(b"%")
+            out.extend(part)
+    return out.decode()
+
+def parse_qs(qs):
+    """Decode 'a=1&b=x+y' into {'a': '1', 'b': 'x y'}; the first value of a repeated key wins."""
+    if isinstance(qs, (bytes, bytearray)):
+        qs = bytes(qs)
+    else:
+        qs = qs.encode()
+    result = {}
+    for pair in qs.split(b"&"):
+        if not pair:
+            continue
+        key, _, val = pair.partition(b"=")
+        key = unquote_plus(key)
+        if key not in result:
+            result[key] = unquote_plus(val)
+    return result
+
+async def read_request(reader, max_body=MAX_BODY):
+    """Read one request from a LineReader (a bare StreamReader is wrapped).
+
+    Lines are collected across partial recvs, so the request line, headers and
+    body can arrive in any number of TCP segments; no line is buffered past its
+    size limit. Returns None on a clean EOF.
+    """
+    if not isinstance(reader, LineReader):
+        reader = LineReader(reader)
+    line = await reader.readline(MAX_REQUEST_LINE)
+    if line is None:
+        raise HttpError(414, "URI Too Long")
+    if not line:
+        return None
+    # Non-UTF-8 bytes and bad escapes are the client's fault, not a server error
+    try:
+        method, target, version = line.decode().split(" ", 2)
+        path, _, qs = target.partition("?")
+        query = parse_qs(qs) if qs else {}
+    except (UnicodeError, ValueError):
+        raise HttpError(400, "Bad Request")
+
+    headers = {}
+    while True:
+        line = await reader.readline(MAX_HEADER_LINE)
+        if line is None:
+            raise HttpError(431, "Request Header Fields Too Large")
+        if not line:
+            raise HttpError(400, "Bad Request")
+        if line in (b"\r\n", b"\n"):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(431, "Request Header Fields Too Large")
+        try:
+            name, _, value = line.decode().partition(":")
+        except UnicodeError:
+            raise HttpError(400, "Bad Request")
+        headers[name.strip().lower()] = value.strip()
+
+    body = b""
+    length = headers.get("content-length")
+    if length:
+        try:
+            length = int(length)
+        except ValueError:
+            raise HttpError(400, "Bad Request")
+        if length < 0:
+            raise HttpError(400, "Bad Request")
+        if length > max_body:
+            raise HttpError(413, "Payload Too Large")
+        buf = bytearray(length)
+        mv = memoryview(buf)
+        got = 0
+        while got < length:
+            chunk = await reader.read(length - got)
+            if not chunk:
+                raise HttpError(400, "Bad Request")
+            mv[got:got + len(chunk)] = chunk
+            got += len(chunk)
+        body = bytes(buf)
+
+    return Request(method, path, query, headers, body, version.strip())
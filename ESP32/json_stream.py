@@ -0,0 +1,153 @@
+# json_stream.py
+# Incremental JSON scanner that keeps only selected scalar fields.
+#
+# Bytes are fed as they arrive from the socket. The scanner tracks just the
+# container nesting and the current key, so its memory does not grow with the
+# document; strings under keys nobody asked for are skipped without copying.
+
+MAX_DEPTH = 16
+MAX_TOKEN = 48  # longer keys/values are truncated
+
+_WHITESPACE = b" \t\r\n"
+_QUOTE = 0x22
+_BACKSLASH = 0x5C
+_ESCAPES = {ord("n"): 0x0A, ord("t"): 0x09, ord("r"): 0x0D, ord("b"): 0x08, ord("f"): 0x0C}
+
+class JsonStreamError(ValueError):
+    pass
+
+class FieldExtractor:
+    """Calls on_record(dict) with the wanted fields of each object that has any.
+
+    Values are returned as the strings they appear as in the document
+    (numbers and literals included). Fields are grouped by the innermost
+    object that contains them; on_record fires when that object closes.
+    Simple escapes are decoded; \\uXXXX is kept as the raw letters.
+    """
+    def __init__(self, fields, on_record):
+        self.fields = fields
+        self.on_record = on_record
+        # b"{" / b"[" per open container; preallocated, as MicroPython's bytearray has no pop()
+        self.stack = bytearray(MAX_DEPTH)
+        self.depth = 0
+        self.token = bytearray(MAX_TOKEN)
+        self.token_len = 0
+        self.in_string = False
+        self.escape = False
+        self.capturing = False   # copying the current string/scalar into token
+        self.is_key = False
+        self.expect_key = False
+        self.in_scalar = False
+        self.key = None          # wanted field name the next value belongs to
+        self.record = {}
+        self.record_depth = 0
+
+    def _take(self, c):
+        if self.token_len < MAX_TOKEN:
+            self.token[self.token_len] = c
+            self.token_len += 1
+
+    def _token_str(self):
+        return bytes(self.token[:self.token_len]).decode()
+
+    def _value(self, value):
+        if not self.record:
+            self.record_depth = self.depth
+        self.record[self.key] = value
+        self.key = None
+
+    def _end_scalar(self):
+        if self.in_scalar:
+            self.in_scalar = False
+            if self.capturing:
+                self.capturing = False
+                self._value(self._token_str())
+            self.key = None
+
+    def _end_string(self):
+        self.in_string = False
+        if self.is_key:
+            key = self._token_str()
+            self.key = key if key in self.fields else None
+        elif self.capturing:
+            self._value(self._token_str())
+        else:
+            self.key = None
+        self.capturing = False
+
+    def feed(self, data):
+        i = 0
+        n = len(data)
+        while i < n:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    if self.capturing:
+                        c = data[i]
+                        self._take(_ESCAPES.get(c, c))
+                    i += 1
+                    continue
+                if not self.capturing:
+                    # Skip to the next quote or backslash in one step
+                    q = data.find(b'"', i)
+                    b = data.find(b"\\", i, q if q >= 0 else n)
+                    if b >= 0:
+                        self.escape = True
+                        i = b + 1
+                    elif q >= 0:
+                        self._end_string()
+                        i = q + 1
+                    else:
+                        i = n
+                    continue
+                c = data[i]
+                if c == _BACKSLASH:
+                    self.escape = True
+                elif c == _QUOTE:
+                    self._end_string()
+                else:
+                    self._take(c)
+                i += 1
+                continue
+
+            c = data[i]
+            i += 1
+            if c == _QUOTE:
+                self._end_scalar()
+                self.in_string = True
+                self.is_key = self.expect_key
+                self.capturing = self.is_key or self.key is not None
+                self.token_len = 0
+            elif c == 0x7B or c == 0x5B:  # { [
+                self._end_scalar()
+                if self.depth >= MAX_DEPTH:
+                    raise JsonStreamError("nesting too deep")
+                self.stack[self.depth] = c
+                self.depth += 1
+                self.expect_key = c == 0x7B
+                self.key = None
+            elif c == 0x7D or c == 0x5D:  # } ]
+                self._end_scalar()
+                if not self.depth:
+                    raise JsonStreamError("unbalanced close")
+                if c == 0x7D and self.record and self.record_depth == self.depth:
+                    record = self.record
+                    self.record = {}
+                    self.on_record(record)
+                self.depth -= 1
+                self.expect_key = False
+                self.key = None
+            elif c == 0x3A:  # :
+                self.expect_key = False
+            elif c == 0x2C:  # ,
+                self._end_scalar()
+                self.expect_key = self.depth > 0 and self.stack[self.depth - 1] == 0x7B
+            elif c in _WHITESPACE:
+                self._end_scalar()
+            else:
+                if not self.in_scalar:
+                    self.in_scalar = True
+                    self.capturing = self.key is not None
+                    self.token_len = 0
+                if self.capturing:
+                    self._take(c)
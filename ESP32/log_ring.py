@@ -0,0 +1,70 @@
+# log_ring.py
+# Fixed-size ring of log records in one preallocated bytearray.
+import struct
+import _thread
+
+HEADER = "<IB"  # sequence number, text length
+HEADER_SIZE = 5
+
+class LogRing:
+    def __init__(self, capacity=64, record_size=100):
+        self.capacity = capacity
+        self.record_size = record_size
+        self.max_text = min(record_size - HEADER_SIZE, 255)
+        self.buf = bytearray(capacity * record_size)
+        self.mv = memoryview(self.buf)
+        self.next_seq = 1
+        self.lock = _thread.allocate_lock()  # log() is also called from the motor thread
+
+    def append(self, text):
+        """Store text (truncated to the record size) in O(1); returns its sequence number."""
+        if isinstance(text, str):
+            text = text.encode()
+        n = min(len(text), self.max_text)
+        if n < len(text):
+            # Cut before a UTF-8 continuation byte would split a character
+            while n and text[n] & 0xC0 == 0x80:
+                n -= 1
+        with self.lock:
+            seq = self.next_seq
+            off = (seq % self.capacity) * self.record_size
+            struct.pack_into(HEADER, self.buf, off, seq, n)
+            self.mv[off + HEADER_SIZE:off + HEADER_SIZE + n] = text[:n] if n < len(text) else text
+            self.next_seq = seq + 1
+        return seq
+
+    def first_seq(self):
+        """Oldest sequence number still held."""
+        return max(1, self.next_seq - self.capacity)
+
+    def last_seq(self):
+        return self.next_seq - 1
+
+    def get(self, seq):
+        """Text of record seq as a memoryview into the ring, or None once overwritten."""
+        off = (seq % self.capacity) * self.record_size
+        stored, n = struct.unpack_from(HEADER, self.buf, off)
+        if stored != seq:
+            return None
+        return self.mv[off + HEADER_SIZE:off + HEADER_SIZE + n]
+
+    def entries(self, since=0, limit=None):
+        """Yield (seq, text) oldest first for records newer than since."""
+        start = max(since + 1, self.first_seq())
+        end = self.next_seq
+        if limit is not None:
+            end = min(end, start + limit)
+        for seq in range(start, end):
+            text = self.get(seq)
+            if text is not None:
+                yield seq, text
+
+    def latest(self, count):
+        """Yield (seq, text) newest first for at most count records."""
+        seq = self.last_seq()
+        stop = max(self.first_seq(), seq - count + 1)
+        while seq >= stop:
+            text = self.get(seq)
+            if text is not None:
+                yield seq, text
+            seq -= 1
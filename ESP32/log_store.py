@@ -0,0 +1,144 @@
+# log_store.py
+# Write-behind log persistence: records are batched in RAM and appended to a
+# fixed set of rotating segment files one flash page at a time.
+import os
+import struct
+import time
+import _thread
+import uasyncio as asyncio
+from binascii import crc32
+
+RECORD_HEADER = "<IIH"  # sequence number, crc32 of text, text length
+RECORD_HEADER_SIZE = 10
+
+class LogStore:
+    def __init__(self, directory="logs", segments=4, segment_size=32 * 1024, page_size=4096,
+                 flush_interval_ms=15 * 60_000):
+        self.directory = directory
+        self.segments = segments
+        self.segment_size = segment_size
+        self.flush_interval_ms = flush_interval_ms
+        self.page = bytearray(page_size)
+        self.mv = memoryview(self.page)
+        self.fill = 0
+        self.lock = _thread.allocate_lock()  # log() is also called from the motor thread
+        self.flash_writes = 0
+
+        if directory not in os.listdir():
+            os.mkdir(directory)
+        self.segment, self.segment_bytes, self.seq = self._recover()
+
+    def _path(self, index):
+        return f"{self.directory}/seg{index}.log"
+
+    def _recover(self):
+        """Find the newest segment and last sequence number left by previous boots."""
+        newest, newest_seq, newest_size, newest_torn = 0, 0, 0, False
+        for index in range(self.segments):
+            last_seq, size, torn = 0, 0, False
+            for seq, _ in self._read_segment(index):
+                last_seq = seq
+            try:
+                size = os.stat(self._path(index))[6]
+                torn = size != self._valid_bytes
+            except OSError:
+                pass
+            if last_seq > newest_seq:
+                newest, newest_seq, newest_size, newest_torn = index, last_seq, size, torn
+        if newest_torn:
+            # A write cut short by a reset; start clean rather than append after garbage
+            return self._rotate_from(newest), 0, newest_seq
+        return newest, newest_size, newest_seq
+
+    def _rotate_from(self, index):
+        index = (index + 1) % self.segments
+        with open(self._path(index), "wb"):
+            pass
+        return index
+
+    def _read_segment(self, index):
+        """Yield (seq, text) for every valid record; stops at the first bad CRC.
+
+        Each record is read under the writer's lock, so a flush or rotation
+        from another task or the motor thread is never seen half done. The
+        lock is released before yielding: a consumer may await between
+        records, and log() on this thread would deadlock on a held lock.
+        """
+        self._valid_bytes = 0
+        header = bytearray(RECORD_HEADER_SIZE)
+        try:
+            f = open(self._path(index), "rb")
+        except OSError:
+            return
+        with f:
+            pos = 0
+            while True:
+                with self.lock:
+                    f.seek(pos)
+                    if f.readinto(header) != RECORD_HEADER_SIZE:
+                        return
+                    seq, crc, n = struct.unpack(RECORD_HEADER, header)
+                    text = f.read(n)
+                if len(text) != n or crc32(text) != crc:
+                    return
+                pos += RECORD_HEADER_SIZE + n
+                self._valid_bytes = pos
+                yield seq, text
+
+    def add(self, text):
+        """Buffer one record; flushes first if the page has no room for it."""
+        if isinstance(text, str):
+            text = text.encode()
+        n = min(len(text), len(self.page) - RECORD_HEADER_SIZE)
+        if n < len(text):
+            text = text[:n]
+        with self.lock:
+            if self.fill + RECORD_HEADER_SIZE + n > len(self.page):
+                self._flush_locked()
+            self.seq += 1
+            struct.pack_into(RECORD_HEADER, self.page, self.fill, self.seq, crc32(text), n)
+            self.fill += RECORD_HEADER_SIZE
+            self.mv[self.fill:self.fill + n] = text
+            self.fill += n
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.fill:
+            return
+        if self.segment_bytes + self.fill > self.segment_size:
+            self.segment = self._rotate_from(self.segment)
+            self.segment_bytes = 0
+        with open(self._path(self.segment), "ab") as f:
+            f.write(self.mv[:self.fill])
+        self.segment_bytes += self.fill
+        self.flash_writes += 1
+        self.fill = 0
+
+    def records(self):
+        """Yield persisted (seq, text) oldest first, then the not yet flushed ones."""
+        with self.lock:
+            newest = self.segment
+        for step in range(1, self.segments + 1):
+            for record in self._read_segment((newest + step) % self.segments):
+                yield record
+        # Copy the unflushed page under the lock; it may be flushed or refilled meanwhile
+        with self.lock:
+            page = bytes(self.mv[:self.fill])
+        off = 0
+        while off < len(page):
+            seq, _, n = struct.unpack_from(RECORD_HEADER, page, off)
+            off += RECORD_HEADER_SIZE
+            yield seq, page[off:off + n]
+            off += n
+
+    async def run(self):
+        """Timer flush so a quiet log still reaches flash within flush_interval_ms."""
+        while True:
+            await asyncio.sleep_ms(self.flush_interval_ms)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[ERROR] Log flush failed: {e}")
@@ -1,9 +1,9 @@
 # ESP32 SIDE: Wi-Fi, Scheduler, Web UI, UART Master
-import network, socket, time, urequests, machine, json, os, ntptime
+import network, socket, time, machine, json, os, ntptime
 from machine import UART, RTC, WDT, Timer, I2C, Pin, PWM
 import _thread
-from time_utils import is_dst, get_est_offset, parse_time, today_times
-from sun_data_utils import build_month_cache, load_sun_data, manage_cache, max_cache_age_months
+from time_utils import get_est_offset, format_clock
+from sun_data_utils import SunCache, load_sun_times
 import uasyncio as asyncio
 import sys
 import esp32
@@ -15,46 +15,144 @@ from current_sensor import CurrentSensor
 from neo_pixel import NeoPixelController
 from temperature_sensor import DS18B20Sensor
 from relay_controller import Relay
+from web_server import WebServer, send, send_stream, send_response, connection_header
+from html_template import Template
+import status_page
+from static_files import StaticFiles
+from sensor_snapshot import SensorSnapshot
+from event_bus import EventBus, format_event
+from rate_limiter import RateLimiter
+from metrics import Metrics
+from log_ring import LogRing
+from log_store import LogStore
+from page_cache import PageCache
+from config_store import open_config_store
+from sun_engine import SunEngine
+from sun_schedule import SunSchedule
+from day_planner import DayPlanner, in_window
 
 DEBUG = True
-log_buffer = []
-MAX_LOG_LINES = 45
+log_ring = LogRing(capacity=64, record_size=100)
+LOG_PAGE_LINES = 10     # newest lines rendered into the status page; logs.js fetches the rest
+LOG_MAX_LIMIT = 200
+# Batched to flash one 4 KB page at a time so history survives resets
+log_store = LogStore(directory="logs", segments=4, segment_size=32 * 1024, page_size=4096)
 FAILSAFE=True
+# Bumped by anything shown on the status page that is not a drifting reading
+STATE_VERSION = 0
 HTML_SERVER_RUNNING=False
+STATUS_TEMPLATE = Template(status_page.PARTS)
+HTTP_KEEP_ALIVE_TIMEOUT_S = 30
+HTTP_MAX_REQUESTS_PER_CONNECTION = 5000
+HTTP_MAX_CONNECTIONS = 4
+HTTP_RATE_PER_S = 2     # sustained requests per second per client IP
+HTTP_RATE_BURST = 10
+PAGE_CACHE_TTL_MS = 5000  # upper bound on how stale temperatures and the clock may look
 
 FAILSAFE_OPEN_TO_CLOSED = 22 * 3600 + 30 * 60   # 10:30 PM
 FAILSAFE_CLOSED_TO_OPEN = 8 * 3600             # 8:00 AM
+LOOP_MAX_SLEEP_MS = 20_000  # the loop feeds the 30 s watchdog, so it never sleeps longer than this
 
 wdt = machine.WDT(timeout=30000)
 
+metrics = Metrics(max_counters=16, max_gauges=8, max_histograms=24)
+METRIC_WDT_FEEDS = metrics.counter("wdt_feeds_total", "Watchdog feeds")
+METRIC_WIFI_RECONNECTS = metrics.counter("wifi_reconnects_total", "Wi-Fi connection attempts")
+METRIC_DOOR_MOVES = {
+    "open": metrics.counter("door_moves_total", "Door moves started", 'direction="open"'),
+    "close": metrics.counter("door_moves_total", "Door moves started", 'direction="close"'),
+}
+METRIC_LOOP_MS = metrics.histogram("main_loop_iteration_ms", "Main loop work per iteration, sleep excluded")
+metrics.collect("mem_free_bytes", "gauge", "gc.mem_free()", gc.mem_free)
+metrics.collect("uptime_seconds", "gauge", "Seconds since boot", lambda: time.ticks_ms() // 1000)
+
+metrics.collect("log_flash_writes_total", "counter", "Log pages written to flash", lambda: log_store.flash_writes)
+
+def feed_watchdog():
+    wdt.feed()
+    metrics.inc(METRIC_WDT_FEEDS)
+
+# Live door/current/relay/log events for /events subscribers
+events = EventBus(queue_size=16, max_subscribers=4)
+SSE_HEARTBEAT_S = 15
+SSE_SEND_TIMEOUT_S = 5
+
 # Track recent door action status with a timer flag
 recent_action_flag = False
 recent_action_timer = None
+day_planner = DayPlanner(FAILSAFE_CLOSED_TO_OPEN, FAILSAFE_OPEN_TO_CLOSED)
+# Set when something the timeline depends on changes, so the loop re-plans before its next event
+scheduler_wake = asyncio.ThreadSafeFlag()
 
 def disable_deep_sleep():
     machine.deepsleep(0)  # Disable deep sleep completely in this case
 
+def bump_state(*_):
+    global STATE_VERSION
+    STATE_VERSION += 1
+
+def on_device_event(event, data):
+    # Door and relay changes alter the page; raw current samples only drift
+    if event != "current":
+        bump_state()
+    events.publish(event, data)
+
 def log(msg):
     timestamp = time.localtime()
     entry = f"[{timestamp[1]}/{timestamp[2]} {timestamp[3]:02}:{timestamp[4]:02}:{timestamp[5]:02}] {msg}"
     print(entry)
     #if send_uart_log: send_uart(f"log {msg}")
-    log_buffer.append(entry)
-    if len(log_buffer) > MAX_LOG_LINES:
-        log_buffer.pop(0)
+    log_ring.append(entry)
+    bump_state()
+    log_store.add(entry)
+    events.publish("log", entry)
+
+def reboot(reason):
+    """Deliberate machine.reset() that first gets pending settings and the buffered log onto flash.
+
+    Also called on MemoryError, so each step may fail again; the reset happens regardless.
+    """
+    try:
+        gc.collect()
+        try:
+            log("[INFO] Rebooting: " + reason)
+        except Exception:
+            pass
+        try:
+            motor_config.flush()
+        except Exception as e:
+            print("[ERROR] Settings flush before reset failed:", e)
+        try:
+            log_store.flush()
+        except Exception as e:
+            print("[ERROR] Log flush before reset failed:", e)
+    finally:
+        machine.reset()
 
 CONFIG_FILE = "config.json"
 MOTOR_CONFIG_FILE = "motor_config.json"
-def load_config(file):
-    with open(file) as f:
-        cfg = json.load(f)
-    return cfg
-
-config = load_config(CONFIG_FILE)
-motor_config = load_config(MOTOR_CONFIG_FILE)
+# Settings editable from the web UI, the JSON API and the UART commands: key -> (type, min, max)
+MOTOR_SETTINGS_SCHEMA = {
+    "current_threshold": (int, 1, 20_000),
+    "move_timeout_open_ms": (int, 1_000, 120_000),
+    "move_timeout_close_ms": (int, 1_000, 120_000),
+    "sun_seconds": (int, 0, 86_400),
+    "heat_toggle_temp": (int, -40, 120),
+}
+
+# Kept in NVS; a JSON file is imported again whenever it changes, and /api/config/export gives it back
+config = open_config_store("coop", CONFIG_FILE, log=log)
+motor_config = open_config_store("motor", MOTOR_CONFIG_FILE, MOTOR_SETTINGS_SCHEMA, log=log, debounce_ms=2000)
 LAT, LNG = config["latitude"], config["longitude"]
 SSID, PASSWORD = config["ssid"], config["password"]
 
+# Sunrise/sunset come from the on-board engine; the downloaded cache is only a cross-check
+sun_engine = SunEngine(LAT, LNG)
+sun_schedule = SunSchedule(sun_engine)
+sun_cache = SunCache(LAT, LNG, log, feed=feed_watchdog)
+SUN_API_CROSSCHECK = True
+SUN_CROSSCHECK_TOLERANCE_S = 300
+
 def get_pins(config, device, required_keys):
     device_pins = config.get("pin", {}).get(device)
     if not device_pins:
@@ -98,9 +196,21 @@ motor_controller = MotorController(
     #t-picoc3 in1_pin=14, in2_pin=15, l_en_pin=16, r_en_pin=17,
     in1_pin=ibt_pins["in1"], in2_pin=ibt_pins["in2"], l_en_pin=ibt_pins["l_en"], r_en_pin=ibt_pins["r_en"], 
     current_sensor=current_sensor, move_timeout_open_ms=motor_config["move_timeout_open_ms"],
-    move_timeout_close_ms=motor_config["move_timeout_close_ms"], current_threshold=motor_config["current_threshold"]
+    move_timeout_close_ms=motor_config["move_timeout_close_ms"], current_threshold=motor_config["current_threshold"],
+    listener=on_device_event
 )
 
+def apply_motor_settings(changed):
+    for key, val in changed.items():
+        # MotorController keeps its limits as upper-case attributes
+        if hasattr(motor_controller, key.upper()):
+            setattr(motor_controller, key.upper(), val)
+    bump_state()
+    scheduler_wake.set()
+    log(f"[INFO] Settings updated: {', '.join(changed)}")
+
+motor_config.on_apply = apply_motor_settings
+
 np = NeoPixelController(neo_pixel_pins["din"], brightness=0.1)
 
 rtc_ds = None
@@ -125,8 +235,23 @@ except Exception as e:
 
 heat = None
 light = None
-heat = Relay("heat", relay_pins["heat"], False)
-light = Relay("light", relay_pins["light"], False)
+heat = Relay("heat", relay_pins["heat"], False, listener=on_device_event)
+light = Relay("light", relay_pins["light"], False, listener=on_device_event)
+
+def read_current_ma():
+    # While the door moves the motor thread owns the INA219; reuse its running average
+    if motor_controller.motor_busy:
+        return motor_controller.current_mv
+    return current_sensor.get_current_ma()
+
+sensors = SensorSnapshot(log, metrics=metrics)
+sensors.add("mcu_temp_f", lambda: (esp32.mcu_temperature() * 9 / 5) + 32, interval_ms=30_000)
+if current_sensor:
+    sensors.add("current_ma", read_current_ma, interval_ms=2_000, ttl_ms=10_000)
+if rtc_ds:
+    sensors.add("rtc_temp_f", lambda: (rtc_ds.temperature() * 9 / 5) + 32, interval_ms=60_000)
+if temp_ds:
+    sensors.add("outside_temp_f", temp_ds.read_fahrenheit_async, interval_ms=30_000, ttl_ms=120_000, is_async=True)
 
 
 #for pin in relay_pins:
@@ -134,6 +259,7 @@ light = Relay("light", relay_pins["light"], False)
 def reset_recent_action_flag(_=None):
     global recent_action_flag
     recent_action_flag = False
+    scheduler_wake.set()
     log("[TIMER] Cooldown expired - actions allowed again.")
 
 def start_recent_action_timer():
@@ -173,6 +299,7 @@ def restore_time_from_ds3231():
     log("[INFO] System time restored from DS3231")
     
 def run_motor_thread(action):
+    metrics.inc(METRIC_DOOR_MOVES[action])
     motor_controller.safe_move(action, log)
 
 # --- UART Interface ---
@@ -186,38 +313,24 @@ def send_uart(line, retry_count=0, log_response=True):
     elif line == "status":
         return (f"{motor_controller.door_state}\n")
     elif line == "current":
-        current_mv = current_sensor.get_current_ma()
+        current_mv = sensors.get("current_ma")
         return (f"{current_mv}\n")
     elif line == "config":
-        return (json.dumps(MOTOR_CONFIG_FILE) + "\n")
+        return (json.dumps(motor_config.settings()) + "\n")
     else:
-        commands = [
-            "current_threshold",
-            "move_timeout_open_ms",
-            "move_timeout_close_ms",
-            "sun_seconds",
-            "heat_toggle_temp",
-        ]
-        for key in commands:
-            if line.startswith(f"{key}:"):
-                try:
-                    val = int(line.split(":", 1)[1])
-                    motor_config[key] = val
-                    globals()[key.upper()] = val
-                    setattr(motor_controller, key.upper(), val)
-
-                    with open(MOTOR_CONFIG_FILE, "w") as f:
-                        json.dump(motor_config, f)
-                    log(f"{key} updated\n")
-                except Exception as e:
-                    log(f"invalid {key}: {e}\n")
-                break
+        key, sep, val = line.partition(":")
+        if sep and key in MOTOR_SETTINGS_SCHEMA:
+            try:
+                motor_config.update({key: val})
+            except ValueError as e:
+                log(f"invalid {key}: {e}\n")
 
 # --- NETWORK ---
 def connect_wifi(wifi):
     global HTML_SERVER_RUNNING
     if not wifi.isconnected():
       log("[INFO] attempting wifi connection")
+      metrics.inc(METRIC_WIFI_RECONNECTS)
       wifi.active(False)
       time.sleep(1)  # Give it a moment
       wifi.active(True)
@@ -229,13 +342,13 @@ def connect_wifi(wifi):
           time.sleep(1)
           timeout -= 1
     if wifi.isconnected() and not HTML_SERVER_RUNNING:
-        _thread.start_new_thread(serve, ())
+        asyncio.create_task(web_server.start())
         HTML_SERVER_RUNNING = True
         log(f"[INFO] Web UI starting at http://{wifi.ifconfig()[0]}")
     return wifi.ifconfig()[0] if wifi.isconnected() else None
 
 # --- DOOR AUTOMATION ---
-def auto_check(now_sec, sunrise_sec, sunset_sec):
+def auto_check(now_sec, plan):
     global recent_action_flag, FAILSAFE
     OPEN_STATE="open"
     CLOSE_STATE="close"
@@ -244,211 +357,296 @@ def auto_check(now_sec, sunrise_sec, sunset_sec):
     if recent_action_flag:
         return
     #open 10 minutes before or after sunrise
-    if sunrise_sec - 600 < now_sec < sunrise_sec + 600 and door_state != OPEN_STATE:
+    if in_window(plan.open_window, now_sec) and door_state != OPEN_STATE:
         log("Opening door at sunrise")
         start_recent_action_timer()
         send_uart(OPEN_STATE)
     #close 10-20 minutes after sunset
-    elif sunset_sec + 600 < now_sec < sunset_sec + 1200 and door_state != CLOSE_STATE:
+    elif in_window(plan.close_window, now_sec) and door_state != CLOSE_STATE:
         log("Closing door at sunset")
         start_recent_action_timer()
         send_uart(CLOSE_STATE)
     # Failsafe logic
     if FAILSAFE:
-        if ((now_sec >= FAILSAFE_OPEN_TO_CLOSED and door_state != CLOSE_STATE)
-            or (now_sec < sunrise_sec - 600 and door_state != CLOSE_STATE)):
+        if ((now_sec >= plan.failsafe_close and door_state != CLOSE_STATE)
+            or (now_sec < plan.open_window[0] and door_state != CLOSE_STATE)):
             log("[FAILSAFE] Closing door due to time fallback.")
             start_recent_action_timer()
             send_uart(CLOSE_STATE)
-        elif FAILSAFE_CLOSED_TO_OPEN <= now_sec < sunset_sec and door_state != OPEN_STATE:
+        elif plan.failsafe_open <= now_sec < plan.sunset and door_state != OPEN_STATE:
             log("[FAILSAFE] Opening door due to time fallback.")
             start_recent_action_timer()
             send_uart(OPEN_STATE)
             start_recent_action_timer()
 
 # --- HTML PAGE ---
+def page_sun(ctx):
+    """Today's (sunrise, sunset) seconds from the day's memoized schedule."""
+    return sun_schedule.today(ctx["now"])
+
+def page_logs(ctx):
+    for _, text in log_ring.latest(LOG_PAGE_LINES):
+        yield "<div>"
+        yield text
+        yield "</div>"
+
+STATUS_SLOTS = {
+    "failsafe": lambda c: FAILSAFE,
+    "heat_status": lambda c: "ON" if heat.is_on() else "OFF",
+    "light_status": lambda c: "ON" if light.is_on() else "OFF",
+    "current_threshold": lambda c: motor_config.get("current_threshold", "N/A"),
+    "move_timeout_open_ms": lambda c: motor_config.get("move_timeout_open_ms", "N/A"),
+    "move_timeout_close_ms": lambda c: motor_config.get("move_timeout_close_ms", "N/A"),
+    "sun_seconds": lambda c: motor_config.get("sun_seconds", "N/A"),
+    "heat_toggle_temp": lambda c: motor_config.get("heat_toggle_temp", "N/A"),
+    "internal_temperature": lambda c: sensors.get("mcu_temp_f"),
+    "ds_temperature": lambda c: sensors.get("rtc_temp_f"),
+    "out_ds_temperature": lambda c: sensors.get("outside_temp_f"),
+    "reset_cause": lambda c: machine.reset_cause(),
+    "free_memory": lambda c: gc.mem_free() / 1024,
+    "door_state": lambda c: motor_controller.door_state,
+    "current_current": lambda c: sensors.get("current_ma", "N/A"),
+    "last_highest_average_mv": lambda c: motor_controller.last_higest_average_mv,
+    "date_str": lambda c: f"{c['now'][0]:04d}-{c['now'][1]:02d}-{c['now'][2]:02d}",
+    "local_time_str": lambda c: f"{c['now'][3]:02d}:{c['now'][4]:02d}:{c['now'][5]:02d}",
+    "local_time_seconds": lambda c: c["now"][3] * 3600 + c["now"][4] * 60 + c["now"][5],
+    "sunrise_str": lambda c: format_clock(page_sun(c)[0]),
+    "sunset_str": lambda c: format_clock(page_sun(c)[1]),
+    "failsafe_closed_to_open": lambda c: FAILSAFE_CLOSED_TO_OPEN,
+    "failsafe_open_to_closed": lambda c: FAILSAFE_OPEN_TO_CLOSED,
+    "recent_action_flag": lambda c: recent_action_flag,
+    "last_sync_mday": lambda c: LAST_NTP_SYNC_MDAY,
+    "max_cache_age": lambda c: sun_cache.max_cache_age_months(c["now"][0], c["now"][1]),
+    "log_since": lambda c: log_ring.last_seq(),
+    "log_html": page_logs,
+}
+
 def html_page():
-    now = time.localtime()
-    date_str = f"{now[0]:04d}-{now[1]:02d}-{now[2]:02d}"
-    local_time_str = f"{now[3]:02d}:{now[4]:02d}:{now[5]:02d}"
-    local_time_seconds = parse_time(local_time_str + " MIL")
-    sun_data = load_sun_data()
-    sunrise_seconds, sunset_seconds = today_times(sun_data)
-    sunrise_str = sun_data.get(date_str, {}).get('sunrise', 'N/A')
-    sunset_str = sun_data.get(date_str, {}).get('sunset', 'N/A')
-    sync_time_str = LAST_NTP_SYNC_MDAY
-    current_threshold = motor_config.get("current_threshold", "N/A")
-    move_timeout_open_ms = motor_config.get("move_timeout_open_ms", "N/A")
-    move_timeout_close_ms = motor_config.get("move_timeout_close_ms", "N/A")
-    sun_seconds = motor_config.get("sun_seconds", "N/A")
-    heat_toggle_temp = motor_config.get("heat_toggle_temp", "N/A")
-
-    max_cache_age = max_cache_age_months(now[0], now[1])
-    current_current = "N/A"
-    if current_sensor:
-        current_current = current_sensor.get_current_ma()
-    heat_status = "ON" if heat.is_on() else "OFF"
-    light_status = "ON" if light.is_on() else "OFF"
-
-    log_html = '<br>'.join(log_buffer[::-1])
-    internal_temperature = (esp32.mcu_temperature() * 9 / 5) + 32
-    ds_temperature = (rtc_ds.temperature() * 9 / 5) + 32 if rtc_ds else None
-    out_ds_temperature = temp_ds.read_fahrenheit() if temp_ds else None
-    free_memory = gc.mem_free() / 1024
-    return f"""<!DOCTYPE html><html><body>
-<h2>Auto Coop Door</h2>
-<form action="/" method="get">
-<button name="action" value="open">Open</button>
-<button name="action" value="close">Close</button>
-<button name="action" value="stop">Stop</button>
-<button name="action" value="sync">Sync Time</button>
-<button name="action" value="failsafe">Toggle FAILSAFE from <b>{FAILSAFE}</b></button>
-<button name="action" value="toggle_heat">Toggle Heat from <b>{heat_status}</b></button> 
-<button name="action" value="toggle_light">Toggle Light from <b>{light_status}</b></button> 
-<button name="action" value="reset">Reset()</button>
-<br><br>
-Current Threshold: <input name="current_threshold" type="number" value="{current_threshold}">
-Timeout Open (ms): <input name="move_timeout_open_ms" type="number" value="{move_timeout_open_ms}">
-Timeout Close (ms): <input name="move_timeout_close_ms" type="number" value="{move_timeout_close_ms}">
-Seconds of daylight for light (ms): <input name="sun_seconds" type="number" value="{sun_seconds}">
-Heat on below this temp: <input name="heat_toggle_temp" type="number" value="{heat_toggle_temp}">
-<button type="submit" name="Update Settings" value="1">Update Settings</button>
-</form>
-<p>
-MCU Temp: <b>{internal_temperature}F</b>
- DS3231 Temp: <b>{ds_temperature}F</b>
- DS18X20 Temp: <b>{out_ds_temperature}F</b>
-</p>
-<p>Last Reset:<b>{machine.reset_cause()}</b> Free Mem: <b>{free_memory}KB</b></p>
-<p>Door: <b>{motor_controller.door_state}</b></p>
-<p>Current Current: <b>{current_current} mV</b></p>
-<p>Last Highest Average Current:<b> {motor_controller.last_higest_average_mv} mV</b></p>
-<p>Local Date and Time: <b>{date_str} {local_time_str}</b></p>
-<p>Local Time Seconds: <b>{local_time_seconds}</b></p>
-<p>Sunrise (Door opens between 10m before and 10m after): <b>{sunrise_str}</b></p>
-<p>Sunset (Door closes between 10-20m after): <b>{sunset_str}</b></p>
-<p>Closed to Open Threshold Seconds: <b>{FAILSAFE_CLOSED_TO_OPEN}</b></p>
-<p>Open to Closed Threshold Seconds: <b>{FAILSAFE_OPEN_TO_CLOSED}</b></p>
-<p>Recent Action Cooldown: <b>{recent_action_flag}</b></p>
-<p>Last Sync Mday: <b>{sync_time_str}</b></p>
-<p>Additional Cached Months: <b>{max_cache_age}</b></p>
-<h3>Logs</h3><div style='font-family:monospace;'>{log_html}</div>
-</body></html>"""
-
-# Read the PNG file and print out the byte data
-with open("favicon.ico", "rb") as f:
-    favicon_data = f.read()
-
-# --- WEB SERVER MODIFICATION ---
-def serve():
-    s = socket.socket()
+    """Yields the status page: flash-resident static parts plus the formatted slots."""
+    return STATUS_TEMPLATE.render(STATUS_SLOTS, {"now": time.localtime()})
+
+# --- WEB SERVER ---
+def toggle_failsafe():
+    global FAILSAFE
+    FAILSAFE = not FAILSAFE
+    bump_state()
+    scheduler_wake.set()
+
+def action_move(action):
+    log(f"[INFO] Sending {action}")
+    send_uart(action)
+
+ACTIONS = {
+    "open": lambda: action_move("open"),
+    "close": lambda: action_move("close"),
+    "stop": lambda: action_move("stop"),
+    "sync": sync_time,
+    "failsafe": toggle_failsafe,
+    "toggle_heat": lambda: heat.toggle(),
+    "toggle_light": lambda: light.toggle(),
+    "reset": lambda: reboot("requested from web UI"),
+}
+
+def update_settings(params):
+    # One update for the whole form, so it costs a single flash write
+    changes = {key: params[key] for key in MOTOR_SETTINGS_SCHEMA if params.get(key)}
+    try:
+        motor_config.update(changes)
+    except ValueError as e:
+        log(f"[WARN] Settings rejected: {e}")
+
+async def handle_config(req, writer):
+    """GET returns the settings; POST applies a JSON object of changes all-or-nothing."""
+    if req.method == "POST":
+        try:
+            motor_config.update(json.loads(req.body))
+        except ValueError as e:
+            await send_response(writer, req, "400 Bad Request", json.dumps({"error": str(e)}), "application/json")
+            return
+    await send_response(writer, req, "200 OK", json.dumps(motor_config.settings()), "application/json")
+
+CONFIG_EXPORTS = {CONFIG_FILE: config, MOTOR_CONFIG_FILE: motor_config}
+
+async def handle_config_export(req, writer):
+    """?file=config.json or motor_config.json (the default); ready to upload and import again."""
+    store = CONFIG_EXPORTS.get(req.query.get("file", MOTOR_CONFIG_FILE))
+    if store is None:
+        await send_response(writer, req, "404 Not Found", f"file must be one of {', '.join(CONFIG_EXPORTS)}")
+        return
+    await send_response(writer, req, "200 OK", json.dumps(store.export()), "application/json")
+
+async def handle_index(req, writer):
+    params = req.params()
+    if not params:
+        version = STATE_VERSION
+        cached = page_cache.get(version)
+        if cached is not None:
+            await send(writer, f"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: {page_cache.length}\r\n{connection_header(req)}\r\n")
+            if req.method != "HEAD":
+                await send_stream(writer, cached)
+            return
+        # Streamed without a length, so the connection ends with the page
+        req.keep_alive = False
+        await send(writer, "HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nConnection: close\r\n\r\n")
+        if req.method != "HEAD":
+            await send_stream(writer, page_cache.fill(version, html_page(), lambda: STATE_VERSION))
+        return
+    action = ACTIONS.get(params.get("action"))
+    if action:
+        action()
+    # Only update settings if submit button was clicked
+    if "Update Settings" in params:
+        update_settings(params)
+    await send_response(writer, req, "302 Found", headers="Location: /\r\n")
+
+async def handle_status(req, writer):
+    await send_response(writer, req, "200 OK", json.dumps({"door": motor_controller.door_state, "current_mv": sensors.get("current_ma")}), "application/json")
+
+async def handle_ping(req, writer):
+    await send_response(writer, req, "200 OK", b"pong")
+
+def log_lines(records):
+    for seq, text in records:
+        yield f"{seq} "
+        yield text
+        yield "\n"
+
+async def handle_logs(req, writer):
+    """Plain text 'seq line' records after ?since=, oldest first, at most ?limit= of them."""
+    try:
+        since = int(req.query.get("since", 0))
+        limit = min(int(req.query.get("limit", 50)), LOG_MAX_LIMIT)
+    except ValueError:
+        await send_response(writer, req, "400 Bad Request", b"Bad Request")
+        return
+    # Copy the records before the first await: a log() while the headers drain could
+    # overwrite ring slots and make the body disagree with Content-Length
+    records = [(seq, bytes(text)) for seq, text in log_ring.entries(since, limit)]
+    length = 0
+    for seq, text in records:
+        length += len(str(seq)) + len(text) + 2
+    await send(writer, f"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Length: {length}\r\nCache-Control: no-store\r\n{connection_header(req)}\r\n")
+    if req.method != "HEAD":
+        await send_stream(writer, log_lines(records))
+
+def log_history():
+    for seq, text in log_store.records():
+        yield f"{seq} "
+        yield text
+        yield "\n"
+
+async def handle_log_history(req, writer):
+    """Everything persisted in the flash segments, oldest first; reads one record at a time."""
+    req.keep_alive = False
+    await send(writer, "HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\nConnection: close\r\n\r\n")
+    if req.method != "HEAD":
+        await send_stream(writer, log_history())
+
+async def handle_metrics(req, writer):
+    req.keep_alive = False
+    await send(writer, "HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nConnection: close\r\n\r\n")
+    if req.method != "HEAD":
+        await send_stream(writer, metrics.render())
+
+async def handle_events(req, writer):
+    sub = events.subscribe()
+    if sub is None:
+        await send_response(writer, req, "503 Service Unavailable", b"Too many event subscribers",
+                            headers="Retry-After: 30\r\n")
+        return
+    req.keep_alive = False
     try:
-        global FAILSAFE
-        addr = socket.getaddrinfo('0.0.0.0', 80)[0][-1]
-        s.bind(addr)
-        s.listen(1)
-        log("[INFO] Web server started on port 80")
-        while True:
-            cl, addr = s.accept()
+        await send(writer, b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n"
+                           + format_event("door", motor_controller.door_state))
+        while not sub.dropped:
             try:
-                req = cl.recv(1024).decode()
-
-                if 'GET /?' in req:
-                    if 'action=open' in req:
-                        log("[INFO] Sending open")
-                        send_uart("open")
-                    elif 'action=close' in req:
-                        log("[INFO] Sending close")
-                        send_uart("close")
-                    elif 'action=stop' in req:
-                        log("[INFO] Sending stop")
-                        send_uart("stop")
-                    elif 'action=sync' in req:
-                        sync_time()
-                    elif 'action=failsafe' in req:
-                        FAILSAFE = not FAILSAFE
-                    elif 'action=toggle_heat' in req:
-                        heat.toggle()
-                    elif 'action=toggle_light' in req:
-                        light.toggle()
-                    elif 'action=reset' in req:
-                        machine.reset()
-                    # Only update settings if submit button was clicked
-                    if 'Update+Settings' in req:
-                        for key in ["current_threshold", "move_timeout_open_ms", "move_timeout_close_ms", "heat_toggle_temp", "sun_seconds"]:
-                            if f"{key}=" in req:
-                                try:
-                                    val = int(req.split(f"{key}=")[1].split("&")[0])
-                                    if val != motor_config.get(key):
-                                        send_uart(f"{key}:{val}")
-                                except:
-                                    pass                          
-                        #fetch_motor_config()
-                    cl.send("HTTP/1.0 302 Found\r\nLocation: /\r\n\r\n")
-                    continue
-
-                elif 'GET /status' in req:
-                    cl.send("HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n")
-                    cl.send(json.dumps({"door": motor_controller.door_state, "current_mv": current_sensor.get_current_ma()}))
-                    continue
-
-                elif 'GET /ping' in req:
-                    cl.send("HTTP/1.0 200 OK\r\nContent-Type: text/plain\r\n\r\npong")
-                    continue
-                elif 'GET /favicon.ico' in req:
-                    # Send the ICO data with caching headers
-                    cl.send(b"HTTP/1.1 200 OK\r\n")
-                    cl.send(b"Content-Type: image/x-icon\r\n")
-                    cl.send(b"Cache-Control: public, max-age=31536000\r\n")  # Cache for 1 year
-                    cl.send(b"Connection: close\r\n\r\n")
-                    cl.send(favicon_data)
-                    continue
-                cl.sendall(html_page())
-            finally:
-                cl.close()
-    except Exception as e:
-        log(f"[ERROR] Serve crashed: {e}")
-        sys.print_exception(e)
+                await asyncio.wait_for(sub.wait(), SSE_HEARTBEAT_S)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies open and detects dead clients
+                await send(writer, b": ping\n\n", SSE_SEND_TIMEOUT_S)
+                continue
+            for message in sub.take():
+                await send(writer, message, SSE_SEND_TIMEOUT_S)
     finally:
-        s.close()  # Always close the socket when done        
-        
-def serve_health_check(ip):
-    failure_count = 0
-    while failure_count < 3:
-        try:
-            sock = socket.socket()
-            sock.settimeout(3)
-            sock.connect((ip, 80))
-            sock.send(b"GET /ping HTTP/1.1\r\nHost: %s\r\n\r\n" % ip.encode())
-            response = sock.recv(1024)
-            #print(f"response {response}")
-            sock.close()
-            if b"pong" in response:
-                return True
-        except Exception as e:
-            return False
-        finally:
-            time.sleep(2)
-            failure_count+=1
-    return False
-    
-        
+        events.unsubscribe(sub)
+
+page_cache = PageCache(ttl_ms=PAGE_CACHE_TTL_MS)
+metrics.collect("page_cache_hits_total", "counter", "Status page served from cache", lambda: page_cache.hits)
+metrics.collect("page_cache_misses_total", "counter", "Status page rendered", lambda: page_cache.misses)
+
+web_server = WebServer(log, port=80, backlog=5, keep_alive_timeout_s=HTTP_KEEP_ALIVE_TIMEOUT_S,
+                       max_requests_per_connection=HTTP_MAX_REQUESTS_PER_CONNECTION,
+                       max_connections=HTTP_MAX_CONNECTIONS + events.max_subscribers,
+                       rate_limiter=RateLimiter(HTTP_RATE_PER_S, HTTP_RATE_BURST),
+                       metrics=metrics)
+web_server.priority_paths = ("/ping",)
+static_files = StaticFiles()
+web_server.route("/", handle_index, methods=("GET", "HEAD", "POST"))
+web_server.route("/status", handle_status)
+web_server.route("/ping", handle_ping)
+web_server.route("/events", handle_events, timeout_s=None)
+web_server.route("/metrics", handle_metrics)
+web_server.route("/logs", handle_logs)
+web_server.route("/api/config", handle_config, methods=("GET", "POST"))
+web_server.route("/api/config/export", handle_config_export)
+web_server.route("/logs/history", handle_log_history, timeout_s=60)
+web_server.fallback = static_files.serve
+
+# --- WEB SERVER HEALTH ---
+# Checked every pass from the server's own counters; a real request over the loopback
+# is only made once nothing has been served for a long while
+HEALTH_IDLE_PROBE_MS = 10 * 60_000
+HEALTH_PROBE_RETRY_MS = 60_000        # after a failed probe, or connections accepted but none served
+HEALTH_PROBE_MAX_FAILURES = 3
+health = {"probe_ms": None, "probe_failures": 0, "probing": False, "accepted": 0}
+
+async def loopback_probe(ip):
+    """GET /ping over a real socket; runs as its own task so it never blocks the loop."""
+    health["probing"] = True
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, web_server.port), 3)
+        writer.write(b"GET /ping HTTP/1.0\r\n\r\n")
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(256), 3)
+        ok = b"pong" in response
+    except Exception:
+        ok = False
+    finally:
+        if writer:
+            writer.close()
+        health["probing"] = False
+    health["probe_failures"] = 0 if ok else health["probe_failures"] + 1
+    if not ok:
+        log(f"[WARN] Loopback probe failed ({health['probe_failures']}/{HEALTH_PROBE_MAX_FAILURES})")
+
 async def check_serve_health(ip):
-    if ip:
-        if not serve_health_check(ip):
-            log("log Website is down. Restarting...")
-            machine.reset()
-    
-async def auto_door_check(now, sun_data):
-    now_sec = now[3]*3600 + now[4]*60 + now[5]
-    sunrise_sec, sunset_sec = today_times(sun_data)
-    if sunrise_sec and sunset_sec:
-        auto_check(now_sec, sunrise_sec, sunset_sec)
+    if not ip or not HTML_SERVER_RUNNING:
+        return
+    if health["probe_failures"] >= HEALTH_PROBE_MAX_FAILURES:
+        reboot("website is down")
+    now = time.ticks_ms()
+    last = web_server.last_request_ms
+    # A request finished since the last probe, and recently, shows the server is alive
+    if (last is not None and time.ticks_diff(now, last) < HEALTH_IDLE_PROBE_MS
+            and (health["probe_ms"] is None or time.ticks_diff(last, health["probe_ms"]) >= 0)):
+        health["probe_failures"] = 0
+        health["accepted"] = web_server.connections_accepted
+        return
+    stalled = web_server.connections_accepted != health["accepted"]
+    interval = HEALTH_PROBE_RETRY_MS if stalled or health["probe_failures"] else HEALTH_IDLE_PROBE_MS
+    if not health["probing"] and (health["probe_ms"] is None or time.ticks_diff(now, health["probe_ms"]) > interval):
+        health["probe_ms"] = now
+        health["accepted"] = web_server.connections_accepted
+        asyncio.create_task(loopback_probe(ip))
+
+async def auto_door_check(now_sec, plan):
+    if plan:
+        auto_check(now_sec, plan)
         
 async def auto_temp_check(temp_relay):
-    global temp_ds
-    if temp_ds:
-        current_temp = temp_ds.read_fahrenheit()
+    current_temp = sensors.get("outside_temp_f")
+    if current_temp is not None:
         if current_temp < motor_config["heat_toggle_temp"]:
             if not temp_relay.is_on():
                 temp_relay.on()
@@ -456,36 +654,41 @@ async def auto_temp_check(temp_relay):
             if temp_relay.is_on():
                 temp_relay.off()
     
-async def auto_light_check(now, light_relay, sun_data):
-    now_seconds = now[3]*3600 + now[4]*60 + now[5]
-    sunrise_sec, sunset_sec = today_times(sun_data)
-
-    desired_daylight = motor_config["sun_seconds"]
-    actual_daylight = sunset_sec - sunrise_sec
-
-    if actual_daylight >= desired_daylight:
+async def auto_light_check(now_sec, light_relay, plan, last_sec):
+    """Light on inside the supplement windows; off when a window has ended since last_sec."""
+    if plan is None:
+        return
+    if not plan.daylight_short:
         # Enough natural light for the day, make sure relay is off
         if light_relay.is_on():
             light_relay.off()
         return
 
-    extension = (desired_daylight - actual_daylight) // 2
-    light_on_start_sunrise = sunrise_sec - extension
-    light_on_end_sunrise = sunrise_sec + 300
-
-    light_on_start_sunset = sunset_sec - 300
-    light_on_end_sunset = sunset_sec + extension
-
-    if (light_on_start_sunrise <= now_seconds < light_on_end_sunrise):
-        if not light_relay.is_on():
-            log(f"[INFO] Turning light on for sunrise supplement for {light_on_end-now_seconds} seconds")
-            light_relay.on()
-    elif (light_on_start_sunset <= now_seconds < light_on_end_sunset):
+    light_end = plan.light_until(now_sec)
+    if light_end is not None:
         if not light_relay.is_on():
-            log(f"[INFO] Turning light on for sunset supplement for {light_on_end_sunset-now_seconds} seconds")
+            log(f"[INFO] Turning light on for daylight supplement for {light_end - now_sec} seconds")
             light_relay.on()
+    elif plan.light_off_between(last_sec, now_sec):
+        # Only at the end of a window, so a light switched on by hand stays on
+        if light_relay.is_on():
+            log("[INFO] Turning light off, daylight supplement over")
+            light_relay.off()
 
         
+sun_crosscheck_mday = 0
+
+async def sun_crosscheck(now, sun_times):
+    """Once a day compare the computed times with the downloaded cache, if there is one."""
+    global sun_crosscheck_mday
+    if sun_crosscheck_mday == now[2]:
+        return
+    sun_crosscheck_mday = now[2]
+    api_times = load_sun_times(now[0], now[1], now[2])
+    for name, local_sec, api_sec in zip(("sunrise", "sunset"), sun_times, api_times):
+        if local_sec is not None and api_sec is not None and abs(local_sec - api_sec) > SUN_CROSSCHECK_TOLERANCE_S:
+            log(f"[WARN] Computed {name} {format_clock(local_sec)} differs from API {format_clock(api_sec)}")
+
 async def task_time_sync(now):
     if now[3] > 3:
         if LAST_NTP_SYNC_MDAY < now[2]:
@@ -494,7 +697,7 @@ async def task_time_sync(now):
           
 async def main():
     print(f"Startup, last reset cause: {machine.reset_cause()}")
-    wdt.feed()
+    feed_watchdog()
     if rtc_ds: restore_time_from_ds3231()
     np.show_color((255,0,0))
     ip = None
@@ -505,7 +708,6 @@ async def main():
             log(f"[INFO] Connected to Wi-Fi: {ip}")
             print(f"[INFO] Connected to Wi-Fi: {ip}")
             sync_time()
-            await manage_cache(time.localtime(), LAT, LNG, log)
 
         else:
             log(f"[WARN] Wi-Fi connection failed. Running in offline mode. {wlan.status()}")
@@ -526,32 +728,60 @@ async def main():
             print(f"[ERROR] Debug Sensor: {e}")
             sys.print_exception(e)
 
+    last_sec = -1
+    last_mday = None
+    asyncio.create_task(sensors.run())
+    asyncio.create_task(log_store.run())
+    asyncio.create_task(motor_config.run())
+    if SUN_API_CROSSCHECK:
+        asyncio.create_task(sun_cache.run(wlan.isconnected))
     while True:
         np.random_color()
         try:
-            wdt.feed()
+            loop_start = time.ticks_ms()
+            feed_watchdog()
             #await update_status()
             now = time.localtime()
-            sun_data = load_sun_data()
+            now_sec = now[3]*3600 + now[4]*60 + now[5]
+            sun_times = sun_schedule.today(now)
+            plan = day_planner.today(now[2], sun_times, motor_config["sun_seconds"])
+            if now[2] != last_mday:
+                last_sec = -1  # new day
+                last_mday = now[2]
 
             tasks = [
-                auto_door_check(now, sun_data),
+                auto_door_check(now_sec, plan),
                 auto_temp_check(heat),
-                auto_light_check(now, light,sun_data)
+                auto_light_check(now_sec, light, plan, last_sec)
                 ]
             if ip:
                 tasks.extend([
                 task_time_sync(now),
-                manage_cache(now, LAT, LNG, log),
                 check_serve_health(ip)])
+                if SUN_API_CROSSCHECK:
+                    tasks.append(sun_crosscheck(now, sun_times))
             
             await asyncio.gather(*tasks)
+            last_sec = now_sec
             ip = connect_wifi(wlan)
-            await asyncio.sleep(7)
+            metrics.observe(METRIC_LOOP_MS, time.ticks_diff(time.ticks_ms(), loop_start))
+            # Sleep until the next timeline event, woken early if its inputs change.
+            # The checks and Wi-Fi above take time, so measure from the clock as it is now.
+            next_sec = plan.next_event(now_sec)[0] if plan else now_sec + LOOP_MAX_SLEEP_MS // 1000
+            wake = time.localtime()
+            if wake[2] != now[2]:
+                sleep_ms = 0  # past midnight, plan the new day
+            else:
+                sleep_ms = max(0, min((next_sec - (wake[3]*3600 + wake[4]*60 + wake[5])) * 1000, LOOP_MAX_SLEEP_MS))
+            feed_watchdog()
+            try:
+                await asyncio.wait_for(scheduler_wake.wait(), sleep_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
         
 
         except MemoryError:
-            machine.reset()
+            reboot("MemoryError")
         except Exception as e:
             log(f"[ERROR] Unexpected: {e}")
             print(f"[ERROR] Unexpected: {e}")
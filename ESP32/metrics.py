@@ -0,0 +1,119 @@
+# metrics.py
+# Counters, gauges and fixed-bucket histograms in preallocated arrays,
+# rendered in the Prometheus text exposition format for /metrics.
+from array import array
+
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Histogram sums are kept as integers in 1/SUM_SCALE units; a float32 sum
+# stops absorbing small observations once it grows large
+SUM_SCALE = 1000
+
+class Metrics:
+    def __init__(self, max_counters=16, max_gauges=8, max_histograms=16, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.stride = len(buckets) + 1  # last slot is +Inf
+        # Counters are 64-bit integers so they stay exact; only gauges are float.
+        # Histograms get bucket counts plus count and a scaled integer sum.
+        self.counters = array("q", [0] * max_counters)
+        self.gauges = array("f", [0] * max_gauges)
+        self.hist_counts = array("L", [0] * (max_histograms * self.stride))
+        self.hist_totals = array("L", [0] * max_histograms)
+        self.hist_sums = array("q", [0] * max_histograms)
+        self.max_counters = max_counters
+        self.max_gauges = max_gauges
+        self.max_histograms = max_histograms
+        self.n_counters = 0
+        self.n_gauges = 0
+        self.n_histograms = 0
+        # name -> [type, help, [(labels, slot or callable), ...]] in registration order
+        self.families = {}
+        self.order = []
+
+    def _family(self, name, kind, help_text):
+        family = self.families.get(name)
+        if family is None:
+            family = [kind, help_text, []]
+            self.families[name] = family
+            self.order.append(name)
+        elif family[0] != kind:
+            raise ValueError(f"metric {name} already registered as {family[0]}")
+        return family
+
+    def counter(self, name, help_text, labels=""):
+        """Register a counter series; returns the slot to pass to inc()."""
+        if self.n_counters >= self.max_counters:
+            raise ValueError("metrics: out of counter slots")
+        slot = self.n_counters
+        self.n_counters += 1
+        self._family(name, "counter", help_text)[2].append((labels, slot))
+        return slot
+
+    def gauge(self, name, help_text, labels=""):
+        """Register a gauge series; returns the slot to pass to set()."""
+        if self.n_gauges >= self.max_gauges:
+            raise ValueError("metrics: out of gauge slots")
+        slot = self.n_gauges
+        self.n_gauges += 1
+        self._family(name, "gauge", help_text)[2].append((labels, slot))
+        return slot
+
+    def collect(self, name, kind, help_text, fn, labels=""):
+        """Series whose value is read from fn() at render time, for numbers kept elsewhere."""
+        self._family(name, kind, help_text)[2].append((labels, fn))
+
+    def histogram(self, name, help_text, labels=""):
+        """Register a histogram series; returns the index to pass to observe()."""
+        if self.n_histograms >= self.max_histograms:
+            raise ValueError("metrics: out of histogram slots")
+        index = self.n_histograms
+        self.n_histograms += 1
+        self._family(name, "histogram", help_text)[2].append((labels, index))
+        return index
+
+    def inc(self, slot, n=1):
+        self.counters[slot] += n
+
+    def set(self, slot, value):
+        self.gauges[slot] = value
+
+    def observe(self, index, value):
+        base = index * self.stride
+        i = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            i += 1
+        self.hist_counts[base + i] += 1
+        self.hist_totals[index] += 1
+        self.hist_sums[index] += int(value * SUM_SCALE)
+
+    def render(self):
+        """Yield the exposition text one line at a time."""
+        for name in self.order:
+            kind, help_text, series = self.families[name]
+            yield f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n"
+            for labels, slot in series:
+                if kind == "histogram":
+                    for line in self._render_histogram(name, labels, slot):
+                        yield line
+                    continue
+                if callable(slot):
+                    value = slot()
+                else:
+                    value = self.counters[slot] if kind == "counter" else self.gauges[slot]
+                if isinstance(value, float) and value == int(value):
+                    value = int(value)
+                yield f"{name}{{{labels}}} {value}\n" if labels else f"{name} {value}\n"
+
+    def _render_histogram(self, name, labels, index):
+        prefix = labels + "," if labels else ""
+        base = index * self.stride
+        cumulative = 0
+        for i, bound in enumerate(self.buckets):
+            cumulative += self.hist_counts[base + i]
+            yield f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}\n'
+        total = self.hist_totals[index]
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {total}\n'
+        suffix = f"{{{labels}}}" if labels else ""
+        total_sum = self.hist_sums[index]
+        yield f"{name}_sum{suffix} {total_sum // SUM_SCALE}.{total_sum % SUM_SCALE:03d}\n{name}_count{suffix} {total}\n"
@@ -3,7 +3,7 @@ import time
 from current_sensor import CurrentSensor
 
 class MotorController:
-    def __init__(self, in1_pin, in2_pin, l_en_pin, r_en_pin, current_sensor, pwm_freq=1000, move_timeout_open_ms=5000, move_timeout_close_ms=5000, current_threshold=1000, current_idle_threshold=5):
+    def __init__(self, in1_pin, in2_pin, l_en_pin, r_en_pin, current_sensor, pwm_freq=1000, move_timeout_open_ms=5000, move_timeout_close_ms=5000, current_threshold=1000, current_idle_threshold=5, listener=None):
         # Motor pins
         self.IN1 = PWM(Pin(in1_pin))
         self.IN2 = PWM(Pin(in2_pin))
@@ -24,13 +24,27 @@ class MotorController:
         # Current sensor instance
         self.current_sensor = current_sensor
 
+        # listener(event, data) is told about door state changes and averaged current samples
+        self.listener = listener
+
         # State
         self.motor_busy = False
-        self.door_state = "stopped"
+        self._door_state = "stopped"
         self.current_mv = 0
         self.last_higest_average_mv = 0
         self.motor_stop()
 
+    @property
+    def door_state(self):
+        return self._door_state
+
+    @door_state.setter
+    def door_state(self, state):
+        if state != self._door_state:
+            self._door_state = state
+            if self.listener:
+                self.listener("door", state)
+
     def motor_stop(self):
         """Stops the motor."""
         self.IN1.duty_u16(0)
@@ -96,6 +110,8 @@ class MotorController:
                         if len(current_buffer) > buffer_size:
                             avg_current = sum(current_buffer) / len(current_buffer)
                             self.current_mv = avg_current
+                            if self.listener:
+                                self.listener("current", avg_current)
                             if higest_average_mv < avg_current:
                                 higest_average_mv = avg_current
                             current_buffer.pop(0)
@@ -0,0 +1,48 @@
+# page_cache.py
+import time
+
+class PageCache:
+    """Rendered page fragments, valid while the state version is unchanged and younger than ttl_ms.
+
+    The TTL bounds how stale drifting fields (temperatures, clock, free memory)
+    can get; every other change is expected to bump the state version.
+    The page is kept as the tuple of fragments it was rendered from, not
+    joined into one buffer, so caching never needs a second page-sized copy.
+    """
+    def __init__(self, ttl_ms=5000):
+        self.ttl_ms = ttl_ms
+        self.data = None
+        self.length = 0
+        self.version = -1
+        self.stamp = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version):
+        if self.data is not None and version == self.version and time.ticks_diff(time.ticks_ms(), self.stamp) < self.ttl_ms:
+            self.hits += 1
+            return self.data
+        self.misses += 1
+        return None
+
+    def invalidate(self):
+        self.data = None
+
+    def fill(self, version, fragments, current_version):
+        """Pass fragments through while keeping them; store them if the state did not move meanwhile."""
+        self.data = None
+        kept = []
+        length = 0
+        for fragment in fragments:
+            if isinstance(fragment, str):
+                fragment = fragment.encode()
+            elif not isinstance(fragment, bytes):
+                fragment = bytes(fragment)  # views into buffers that will be reused
+            kept.append(fragment)
+            length += len(fragment)
+            yield fragment
+        if current_version() == version:
+            self.data = tuple(kept)
+            self.length = length
+            self.version = version
+            self.stamp = time.ticks_ms()
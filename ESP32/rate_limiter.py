@@ -0,0 +1,42 @@
+# rate_limiter.py
+import time
+
+class RateLimiter:
+    """Token bucket per client key (IP address).
+
+    Each client may burst up to `burst` requests and then gets `rate_per_s`
+    more per second. Only the most recent `max_clients` keys are tracked so
+    the table cannot grow without bound.
+    """
+    def __init__(self, rate_per_s=2, burst=10, max_clients=16):
+        self.rate_per_ms = rate_per_s / 1000
+        self.burst = burst
+        self.max_clients = max_clients
+        # key -> [tokens, last_refill_ms]
+        self.buckets = {}
+
+    def allow(self, key):
+        now = time.ticks_ms()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_clients:
+                self._evict(now)
+            bucket = [self.burst, now]
+            self.buckets[key] = bucket
+        else:
+            elapsed = time.ticks_diff(now, bucket[1])
+            bucket[0] = min(self.burst, bucket[0] + elapsed * self.rate_per_ms)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+    def _evict(self, now):
+        oldest = None
+        oldest_age = -1
+        for key, bucket in self.buckets.items():
+            age = time.ticks_diff(now, bucket[1])
+            if age > oldest_age:
+                oldest, oldest_age = key, age
+        del self.buckets[oldest]
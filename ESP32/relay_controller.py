@@ -2,20 +2,32 @@ from machine import Pin
 import time
 
 class Relay:
-    def __init__(self, name, pin_num, active_high=True):
+    def __init__(self, name, pin_num, active_high=True, listener=None):
         self.name = name
         self.pin = Pin(pin_num, Pin.OUT)
         self.active_high = active_high
+        # listener("relay", {"name": ..., "on": ...}) is called whenever the relay changes
+        self.listener = listener
         self.off()
 
+    def _notify(self, before):
+        if self.listener and self.pin.value() != before:
+            self.listener("relay", {"name": self.name, "on": self.is_on()})
+
     def on(self):
+        before = self.pin.value()
         self.pin.value(1 if self.active_high else 0)
+        self._notify(before)
 
     def off(self):
+        before = self.pin.value()
         self.pin.value(0 if self.active_high else 1)
+        self._notify(before)
 
     def toggle(self):
+        before = self.pin.value()
         self.pin.value(not self.pin.value())
+        self._notify(before)
 
     def is_on(self):
         return self.pin.value() == (1 if self.active_high else 0)
@@ -0,0 +1,62 @@
+# sensor_snapshot.py
+# One background sampler owns the I2C and OneWire reads; everyone else reads the snapshot.
+import time
+import sys
+import uasyncio as asyncio
+
+class SensorSnapshot:
+    def __init__(self, log, idle_ms=1000, metrics=None):
+        self.log = log
+        self.idle_ms = idle_ms
+        self.metrics = metrics
+        # name -> histogram index of read latency
+        self.latency = {}
+        # name -> [read_fn, is_async, interval_ms, ttl_ms, next_due_ms]
+        self.sources = {}
+        self.values = {}
+        self.stamps = {}
+
+    def add(self, name, read, interval_ms, ttl_ms=None, is_async=False):
+        """Sample read() every interval_ms; the value counts as fresh for ttl_ms (default 3 intervals)."""
+        ttl_ms = ttl_ms if ttl_ms is not None else interval_ms * 3
+        self.sources[name] = [read, is_async, interval_ms, ttl_ms, time.ticks_ms()]
+        if self.metrics:
+            self.latency[name] = self.metrics.histogram("sensor_read_ms", "Sensor read time, I2C and OneWire included", f'sensor="{name}"')
+
+    def get(self, name, default=None):
+        """Latest value of name, or default if it was never read or is older than its TTL."""
+        stamp = self.stamps.get(name)
+        if stamp is None or time.ticks_diff(time.ticks_ms(), stamp) > self.sources[name][3]:
+            return default
+        return self.values[name]
+
+    def age_ms(self, name):
+        stamp = self.stamps.get(name)
+        return None if stamp is None else time.ticks_diff(time.ticks_ms(), stamp)
+
+    async def sample(self, name):
+        read, is_async, interval_ms, _, _ = self.sources[name]
+        start = time.ticks_us()
+        try:
+            value = await read() if is_async else read()
+            if self.metrics:
+                self.metrics.observe(self.latency[name], time.ticks_diff(time.ticks_us(), start) / 1000)
+            if value is not None:
+                self.values[name] = value
+                self.stamps[name] = time.ticks_ms()
+        except Exception as e:
+            self.log(f"[ERROR] Sensor {name}: {e}")
+            sys.print_exception(e)
+        self.sources[name][4] = time.ticks_add(time.ticks_ms(), interval_ms)
+
+    async def run(self):
+        while True:
+            now = time.ticks_ms()
+            wait_ms = self.idle_ms
+            for name, source in self.sources.items():
+                due_in = time.ticks_diff(source[4], now)
+                if due_in <= 0:
+                    await self.sample(name)
+                    due_in = source[2]
+                wait_ms = min(wait_ms, due_in)
+            await asyncio.sleep_ms(max(wait_ms, 10))
@@ -0,0 +1,119 @@
+# static_files.py
+# Serves files from the www/ directory on flash in fixed-size chunks.
+import os
+from web_server import send, send_status, connection_header
+
+try:
+    from binascii import crc32
+except ImportError:
+    crc32 = None
+
+STATIC_DIR = "www"
+CHUNK_SIZE = 512
+BUFFER_POOL_SIZE = 2
+
+CONTENT_TYPES = {
+    "html": "text/html",
+    "css": "text/css",
+    "js": "application/javascript",
+    "json": "application/json",
+    "ico": "image/x-icon",
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "txt": "text/plain",
+}
+
+class StaticFiles:
+    def __init__(self, root=STATIC_DIR, chunk_size=CHUNK_SIZE, max_age=86400):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.cache_control = f"public, max-age={max_age}"
+        self._pool = [bytearray(chunk_size) for _ in range(BUFFER_POOL_SIZE)]
+        # url path -> (etag, size, gz_size); size is None when only the .gz is shipped
+        self.files = {}
+        self._index(root, "")
+
+    def _index(self, directory, prefix):
+        """Walk root once at startup so requests never stat or hash files."""
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            path = f"{directory}/{name}"
+            st = os.stat(path)
+            if st[0] & 0x4000:  # directory
+                self._index(path, f"{prefix}/{name}")
+                continue
+            if name.endswith(".gz"):
+                try:
+                    os.stat(path[:-3])
+                except OSError:
+                    # Shipped gzipped only: serve it under the plain name
+                    self.files[f"{prefix}/{name[:-3]}"] = (self._etag(path, st)[:-1] + '-gz"', None, st[6])
+                continue
+            gz_size = None
+            try:
+                gz_size = os.stat(path + ".gz")[6]
+            except OSError:
+                pass
+            self.files[f"{prefix}/{name}"] = (self._etag(path, st), st[6], gz_size)
+
+    def _etag(self, path, st):
+        if crc32 is None:
+            return f'"{st[6]:x}-{st[8]:x}"'
+        crc = 0
+        buf = self._pool[0]
+        mv = memoryview(buf)
+        with open(path, "rb") as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                crc = crc32(mv[:n], crc)
+        return f'"{crc & 0xffffffff:08x}"'
+
+    def content_type(self, path):
+        return CONTENT_TYPES.get(path.rsplit(".", 1)[-1], "application/octet-stream")
+
+    async def serve(self, req, writer):
+        entry = self.files.get(req.path)
+        if entry is None:
+            await send_status(writer, 404, "Not Found", req)
+            return
+        etag, size, gz_size = entry
+        if size is None:
+            use_gz = True
+            size = gz_size
+        else:
+            use_gz = gz_size is not None and "gzip" in req.headers.get("accept-encoding", "")
+            if use_gz:
+                etag = etag[:-1] + '-gz"'
+                size = gz_size
+
+        if req.headers.get("if-none-match") == etag:
+            await send(writer, f"HTTP/1.1 304 Not Modified\r\nETag: {etag}\r\nCache-Control: {self.cache_control}\r\n{connection_header(req)}\r\n")
+            return
+
+        headers = f"HTTP/1.1 200 OK\r\nContent-Type: {self.content_type(req.path)}\r\nContent-Length: {size}\r\nETag: {etag}\r\nCache-Control: {self.cache_control}\r\n"
+        if use_gz:
+            headers += "Content-Encoding: gzip\r\n"
+        if gz_size is not None and entry[1] is not None:  # both variants exist
+            headers += "Vary: Accept-Encoding\r\n"
+        await send(writer, headers + connection_header(req) + "\r\n")
+        if req.method == "HEAD":
+            return
+
+        path = self.root + req.path + (".gz" if use_gz else "")
+        buf = self._pool.pop() if self._pool else bytearray(self.chunk_size)
+        try:
+            mv = memoryview(buf)
+            with open(path, "rb") as f:
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    await send(writer, mv[:n])
+        finally:
+            if len(self._pool) < BUFFER_POOL_SIZE:
+                self._pool.append(buf)
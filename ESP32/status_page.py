@@ -0,0 +1,60 @@
+# Generated by html_template.py - edit the .html source instead.
+PARTS = (
+    b'<!DOCTYPE html><html><body>\n<h2>Auto Coop Door</h2>\n<form action="/" method="get">\n<button name="action" value="open">Open</button>\n<button name="action" value="close">Close</button>\n<button name="action" value="stop">Stop</button>\n<button name="action" value="sync">Sync Time</button>\n<button name="action" value="failsafe">Toggle FAILSAFE from <b>',
+    'failsafe',
+    b'</b></button>\n<button name="action" value="toggle_heat">Toggle Heat from <b>',
+    'heat_status',
+    b'</b></button> \n<button name="action" value="toggle_light">Toggle Light from <b>',
+    'light_status',
+    b'</b></button> \n<button name="action" value="reset">Reset()</button>\n<br><br>\nCurrent Threshold: <input name="current_threshold" type="number" value="',
+    'current_threshold',
+    b'">\nTimeout Open (ms): <input name="move_timeout_open_ms" type="number" value="',
+    'move_timeout_open_ms',
+    b'">\nTimeout Close (ms): <input name="move_timeout_close_ms" type="number" value="',
+    'move_timeout_close_ms',
+    b'">\nSeconds of daylight for light (ms): <input name="sun_seconds" type="number" value="',
+    'sun_seconds',
+    b'">\nHeat on below this temp: <input name="heat_toggle_temp" type="number" value="',
+    'heat_toggle_temp',
+    b'">\n<button type="submit" name="Update Settings" value="1">Update Settings</button>\n</form>\n<p>\nMCU Temp: <b>',
+    'internal_temperature',
+    b'F</b>\n DS3231 Temp: <b>',
+    'ds_temperature',
+    b'F</b>\n DS18X20 Temp: <b>',
+    'out_ds_temperature',
+    b'F</b>\n</p>\n<p>Last Reset:<b>',
+    'reset_cause',
+    b'</b> Free Mem: <b>',
+    'free_memory',
+    b'KB</b></p>\n<p>Door: <b>',
+    'door_state',
+    b'</b></p>\n<p>Current Current: <b>',
+    'current_current',
+    b' mV</b></p>\n<p>Last Highest Average Current:<b> ',
+    'last_highest_average_mv',
+    b' mV</b></p>\n<p>Local Date and Time: <b>',
+    'date_str',
+    b' ',
+    'local_time_str',
+    b'</b></p>\n<p>Local Time Seconds: <b>',
+    'local_time_seconds',
+    b'</b></p>\n<p>Sunrise (Door opens between 10m before and 10m after): <b>',
+    'sunrise_str',
+    b'</b></p>\n<p>Sunset (Door closes between 10-20m after): <b>',
+    'sunset_str',
+    b'</b></p>\n<p>Closed to Open Threshold Seconds: <b>',
+    'failsafe_closed_to_open',
+    b'</b></p>\n<p>Open to Closed Threshold Seconds: <b>',
+    'failsafe_open_to_closed',
+    b'</b></p>\n<p>Recent Action Cooldown: <b>',
+    'recent_action_flag',
+    b'</b></p>\n<p>Last Sync Mday: <b>',
+    'last_sync_mday',
+    b'</b></p>\n<p>Additional Cached Months: <b>',
+    'max_cache_age',
+    b'</b></p>\n<h3>Logs</h3><p><a href="/logs/history">Full log</a></p>\n<div id="log" data-since="',
+    'log_since',
+    b'" style=\'font-family:monospace;\'>',
+    'log_html',
+    b'</div>\n<script src="/logs.js" defer></script>\n</body></html>\n',
+)
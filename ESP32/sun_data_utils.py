@@ -1,75 +1,315 @@
-import time, os, json, sys, urequests
+import time, os, sys, json
+from binascii import crc32
+import uasyncio as asyncio
+import async_http
+from json_stream import FieldExtractor
+from time_utils import parse_time
+from sun_table import SunTable, create_pending, set_day, pending_days, HEADER_SIZE, RECORD_SIZE
+from config_store import write_json_atomic, recover_file, replace_file
 
 CACHE_DIR = "sun_cache"
+# Month tables are YYYY-MM.sun; the engine's year tables YYYY.sun share the directory.
+# A month being downloaded is YYYY-MM.part until every day is in.
+MONTH_SUFFIX = ".sun"
+PART_SUFFIX = ".part"
+MANIFEST = f"{CACHE_DIR}/index.json"
+MONTH_TABLE_MAX = HEADER_SIZE + 31 * RECORD_SIZE
+SUN_API_URL = "https://api.sunrisesunset.io/json"
+SUN_FIELDS = ("date", "sunrise", "sunset")
+
+_table = SunTable()
+
+def month_path(year, month, suffix=MONTH_SUFFIX):
+    return f"{CACHE_DIR}/{year:04d}-{month:02d}{suffix}"
+
+def month_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+def parse_key(key):
+    return int(key[:4]), int(key[5:7])
+
+def file_entry(path, fetched_at):
+    """[size, crc32, fetched_at] for a cache file, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return [len(data), crc32(data), fetched_at]
+
+def parse_month_name(fname):
+    """(year, month) for a complete or partial month table file name, else None."""
+    for suffix in (MONTH_SUFFIX, PART_SUFFIX):
+        if fname.endswith(suffix):
+            try:
+                y, m = map(int, fname[:-len(suffix)].split("-"))
+            except ValueError:
+                return None
+            return y, m
+    return None
+
+def days_in_month(year, month):
+    t = time.mktime((year + month // 12, month % 12 + 1, 1, 0, 0, 0, 0, 0))
+    return time.localtime(t - 86400)[2]
+
+def load_sun_times(year, month, day):
+    """(sunrise, sunset) seconds from the downloaded month table; (None, None) if not cached."""
+    return _table.lookup(month_path(year, month), day - 1)
 
 # --- SUNRISE/SUNSET ---
-def build_month_cache(year, month, lat, lng, log):
-    sun_data = {}
-    log(f"Bulding sunrise/sunset cache for {year}/{month}")
-    for day in range(1, 32):
+class SunCache:
+    """Downloads API month tables in the background.
+
+    A month is one date_start/date_end range request; if that fails the
+    missing days are fetched one by one, a few at a time. Progress is kept in
+    the .part table on flash after every day, so a reset or lost connection
+    resumes the month instead of starting it over.
+    """
+    def __init__(self, lat, lng, log, feed=None, concurrency=2, months_ahead=7, budget_bytes=4 * 1024,
+                 min_free_bytes=64 * 1024, request_gap_ms=300, check_interval_s=3600, retry_interval_s=300):
+        self.lat = lat
+        self.lng = lng
+        self.log = log
+        self.feed = feed
+        self.concurrency = concurrency
+        self.months_ahead = months_ahead
+        self.budget_bytes = budget_bytes      # all month tables together
+        self.min_free_bytes = min_free_bytes  # left free on the filesystem
+        self.manifest = None
+        self.request_gap_ms = request_gap_ms
+        self.check_interval_s = check_interval_s
+        self.retry_interval_s = retry_interval_s
+        # (year, month) for which every wanted month was already on flash; skips all file access
+        self.complete_for = None
+        # (year, month) whose stale .part files were already removed
+        self.swept_for = None
+        self.fetch_errors = 0
+
+    def day_url(self, year, month, day):
+        return f"{SUN_API_URL}?lat={self.lat}&lng={self.lng}&date={year:04d}-{month:02d}-{day:02d}"
+
+    def range_url(self, year, month, first_day, last_day):
+        return (f"{SUN_API_URL}?lat={self.lat}&lng={self.lng}"
+                f"&date_start={year:04d}-{month:02d}-{first_day:02d}"
+                f"&date_end={year:04d}-{month:02d}-{last_day:02d}")
+
+    async def fetch_records(self, url, on_record, timeout_s=15):
+        """Stream the response through the field extractor; the body is never held in RAM."""
+        r = await async_http.stream(url, timeout_s)
         try:
-            t = time.mktime((year, month, day, 0, 0, 0, 0, 0))
-            tm = time.localtime(t)
-            date_str = f"{tm[0]:04d}-{tm[1]:02d}-{tm[2]:02d}"
-            url = f"https://api.sunrisesunset.io/json?lat={lat}&lng={lng}&date={date_str}"
-            r = urequests.get(url)
-            js = r.json()['results']
-            sun_data[date_str] = js
-            time.sleep(0.3)
-        except Exception as e:
-            print("downloading day")
-            sys.print_exception(e)
-            break
-    with open(f"{CACHE_DIR}/{year}-{month:02d}.json", 'w') as f:
-        f.write(json.dumps(sun_data))
-    log(f"Wrote sunrise/sunset cache for {year}/{month}")
-def load_sun_data():
-    try:
-        now = time.localtime()
-        fname = f"{CACHE_DIR}/{now[0]:04d}-{now[1]:02d}.json"
-        with open(fname) as f:
-            return json.loads(f.read())
-    except:
-        return {}
-
-async def manage_cache(now, lat, lng, log):
-    current_year = now[0]
-    current_month = now[1]
-    
-
-    if CACHE_DIR not in os.listdir():
-        os.mkdir(CACHE_DIR)
-
-    for i in range(7):
-        month = current_month + i
-        year = current_year + (month - 1) // 12
-        month = ((month - 1) % 12) + 1
-        fname = f"{year}-{month:02d}.json"
-        if fname not in os.listdir(CACHE_DIR):
-            build_month_cache(year, month, lat, lng, log)
-            #only one month at a time to avoid watchdog issues
-            break
-
-    for fname in os.listdir(CACHE_DIR):
+            if r.status != 200:
+                raise async_http.HttpClientError(f"HTTP {r.status}")
+            extractor = FieldExtractor(SUN_FIELDS, on_record)
+            while True:
+                chunk = await r.read()
+                if not chunk:
+                    break
+                extractor.feed(chunk)
+        finally:
+            await r.close()
+
+    async def fetch_range(self, path, year, month, pending):
+        """One request for all pending days, written straight into the table; returns days stored."""
+        prefix = f"{year:04d}-{month:02d}-"
+        stored = [0]
+
+        def store(day):
+            date = day.get("date", "")
+            if date.startswith(prefix):
+                index = int(date[len(prefix):]) - 1
+                if index in pending:
+                    set_day(path, index, parse_time(day.get("sunrise", "N/A")), parse_time(day.get("sunset", "N/A")))
+                    stored[0] += 1
+
+        url = self.range_url(year, month, min(pending) + 1, max(pending) + 1)
+        await self.fetch_records(url, store, timeout_s=30)
+        return stored[0]
+
+    async def fetch_day(self, year, month, day):
+        found = []
+        await self.fetch_records(self.day_url(year, month, day), found.append)
+        if not found:
+            raise ValueError("no sunrise/sunset in response")
+        return parse_time(found[0].get("sunrise", "N/A")), parse_time(found[0].get("sunset", "N/A"))
+
+    async def _worker(self, path, year, month, pending):
+        while pending:
+            index = pending.pop()
+            try:
+                rise, sset = await self.fetch_day(year, month, index + 1)
+                set_day(path, index, rise, sset)
+            except Exception as e:
+                self.fetch_errors += 1
+                self.log(f"[WARN] Sun data for {year}-{month:02d}-{index + 1:02d} failed: {e}")
+                return
+            if self.feed:
+                self.feed()
+            await asyncio.sleep_ms(self.request_gap_ms)
+
+    async def build_month(self, year, month):
+        """Fill in the month's missing days; True once the complete table is in place."""
+        part = month_path(year, month, PART_SUFFIX)
+        pending = pending_days(part)
+        if pending is None:
+            create_pending(part, year, month, self.lat, self.lng, days_in_month(year, month))
+            pending = pending_days(part)
+            self.log(f"Bulding sunrise/sunset cache for {year}/{month}")
+        elif pending:
+            self.log(f"Resuming sunrise/sunset cache for {year}/{month}, {len(pending)} days left")
+        if pending:
+            try:
+                await self.fetch_range(part, year, month, pending)
+                pending = pending_days(part)
+            except Exception as e:
+                self.fetch_errors += 1
+                self.log(f"[WARN] Sun data range request for {year}/{month} failed, fetching days: {e}")
+            if self.feed:
+                self.feed()
+        await asyncio.gather(*[self._worker(part, year, month, pending)
+                               for _ in range(min(self.concurrency, len(pending)))])
+        if pending_days(part):
+            return False
+        replace_file(part, month_path(year, month))
+        self.log(f"Wrote sunrise/sunset cache for {year}/{month}")
+        return True
+
+    # --- manifest: "YYYY-MM" -> [size, crc32, fetched at], the only record of what is cached ---
+    def _load_manifest(self):
+        if self.manifest is not None:
+            return
         try:
-            y, m = map(int, fname.replace(".json", "").split("-"))
-            age_months = (current_year - y) * 12 + (current_month - m)
-            if age_months > 2:
-                os.remove(f"{CACHE_DIR}/{fname}")
-        except:
-            continue
-        
-def max_cache_age_months(current_year, current_month):
-    max_age = 0
-    try:
+            recover_file(MANIFEST)
+            with open(MANIFEST) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = self._rebuild_manifest()
+            self._save_manifest()
+        self._verify()
+
+    def _rebuild_manifest(self):
+        """One-time directory scan for a missing or unreadable manifest; also clears old formats."""
+        if CACHE_DIR not in os.listdir():
+            os.mkdir(CACHE_DIR)
+        manifest = {}
         for fname in os.listdir(CACHE_DIR):
-            try:
-                y, m = map(int, fname.replace(".json", "").split("-"))
-                age_months = (y - current_year) * 12 + (m - current_month)
-                max_age = max(max_age, age_months)
-            except Exception:
+            ym = parse_month_name(fname)
+            if ym and fname.endswith(MONTH_SUFFIX):
+                manifest[month_key(*ym)] = file_entry(f"{CACHE_DIR}/{fname}", 0)
+            elif fname.endswith(".json") or fname.endswith(".tmp"):
+                try:
+                    os.remove(f"{CACHE_DIR}/{fname}")
+                except OSError:
+                    pass
+        self.log(f"[INFO] Rebuilt sun cache index, {len(manifest)} months")
+        return manifest
+
+    def _save_manifest(self):
+        write_json_atomic(MANIFEST, self.manifest)
+
+    def _verify(self):
+        """Drop months whose file is missing or no longer matches its size and checksum."""
+        bad = [key for key, entry in self.manifest.items()
+               if file_entry(month_path(*parse_key(key)), entry[2]) != entry]
+        for key in bad:
+            self.log(f"[WARN] Sun cache {key} is damaged, fetching again")
+            self._evict(key)
+
+    def _evict(self, key):
+        path = month_path(*parse_key(key))
+        if _table.path == path:
+            _table.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        del self.manifest[key]
+        self._save_manifest()
+
+    def _remove_stale_parts(self, wanted):
+        """Delete partial downloads for months that left the wanted window; they will never be resumed."""
+        for fname in os.listdir(CACHE_DIR):
+            ym = parse_month_name(fname)
+            if ym and fname.endswith(PART_SUFFIX) and month_key(*ym) not in wanted:
+                try:
+                    os.remove(f"{CACHE_DIR}/{fname}")
+                except OSError:
+                    pass
+
+    def cached_bytes(self):
+        return sum(entry[0] for entry in self.manifest.values())
+
+    def _free_bytes(self):
+        st = os.statvfs(CACHE_DIR)
+        return st[1] * st[4]
+
+    def _over_budget(self, extra=0):
+        return self.cached_bytes() + extra > self.budget_bytes or self._free_bytes() - extra < self.min_free_bytes
+
+    def _enforce_budget(self, wanted, extra=0):
+        """Evict the oldest months outside the wanted window until extra more bytes fit; False if they cannot."""
+        while self._over_budget(extra):
+            spare = sorted(key for key in self.manifest if key not in wanted)
+            if not spare:
+                return False
+            self.log(f"[INFO] Evicting sun cache {spare[0]} to stay within flash budget")
+            self._evict(spare[0])
+        return True
+
+    async def ensure(self, now):
+        """Download missing months ahead of now within the flash budget; True if nothing is missing."""
+        current_year, current_month = now[0], now[1]
+        if self.complete_for == (current_year, current_month):
+            return True
+        self._load_manifest()
+
+        wanted = []
+        for i in range(self.months_ahead):
+            month = current_month + i
+            year = current_year + (month - 1) // 12
+            wanted.append((year, ((month - 1) % 12) + 1))
+        wanted_keys = [month_key(y, m) for y, m in wanted]
+        if self.swept_for != (current_year, current_month):
+            # One directory scan per month, not on every retry
+            self._remove_stale_parts(wanted_keys)
+            self.swept_for = (current_year, current_month)
+        self._enforce_budget(wanted_keys)
+
+        complete = True
+        for (year, month), key in zip(wanted, wanted_keys):
+            if key in self.manifest:
                 continue
-    finally:
+            if not self._enforce_budget(wanted_keys, MONTH_TABLE_MAX):
+                # Retrying will not help until the window moves; complete stays True
+                self.log(f"[WARN] Sun cache budget reached, not fetching {key}")
+                break
+            if not await self.build_month(year, month):
+                complete = False
+                break
+            self.manifest[key] = file_entry(month_path(year, month), time.time())
+            self._save_manifest()
+        if complete:
+            self.complete_for = (current_year, current_month)
+        return complete
+
+    def max_cache_age_months(self, current_year, current_month):
+        """How many months past the current one are cached, from the manifest."""
+        max_age = 0
+        for key in self.manifest or ():
+            y, m = parse_key(key)
+            max_age = max(max_age, (y - current_year) * 12 + (m - current_month))
         return max_age
 
+    async def run(self, online=None):
+        """Keep the cache filled while online() says the network is up; retries sooner after a failure."""
+        while True:
+            complete = False
+            if online is None or online():
+                try:
+                    complete = await self.ensure(time.localtime())
+                except Exception as e:
+                    self.log(f"[ERROR] Sun cache: {e}")
+                    sys.print_exception(e)
+                # Idle TLS connections hold tens of KB; the next check is an hour away
+                async_http.client.close_idle()
+            await asyncio.sleep(self.check_interval_s if complete else self.retry_interval_s)
 
@@ -0,0 +1,81 @@
+# sun_engine.py
+# Sunrise/sunset computed on the device with suntime.Sun, no network needed.
+import os
+import time
+from suntime import Sun, SunTimeException
+from time_utils import est_offset_for_date
+from sun_table import SunTable, write_table, read_header, SOURCE_COMPUTED
+
+class SunEngine:
+    def __init__(self, lat, lng, cache_dir="sun_cache", utc_offset=est_offset_for_date):
+        # tzone 0: Sun returns UTC and utc_offset() applies the local offset per date, DST included
+        self.sun = Sun(lat, lng, 0)
+        self.lat = lat
+        self.lng = lng
+        self.cache_dir = cache_dir
+        self.utc_offset = utc_offset
+        self.table = SunTable()
+        self.revision = 0  # bumped whenever a table is rewritten
+
+    def _utc_seconds(self, date, rise):
+        try:
+            t = self.sun.get_sunrise_time(date) if rise else self.sun.get_sunset_time(date)
+        except SunTimeException:
+            return None
+        return t[3] * 3600 + t[4] * 60
+
+    def compute_day(self, year, month, day):
+        """(sunrise, sunset) in local seconds since midnight; None where the sun does not rise/set."""
+        date = (year, month, day)
+        offset = self.utc_offset(year, month, day)
+        rise = self._utc_seconds(date, True)
+        sset = self._utc_seconds(date, False)
+        return (None if rise is None else (rise + offset) % 86400,
+                None if sset is None else (sset + offset) % 86400)
+
+    def year_pairs(self, year):
+        """Yield (sunrise, sunset) for every day of year."""
+        start = time.mktime((year, 1, 1, 12, 0, 0, 0, 0))
+        days = 366 if (year % 4 == 0 and year % 100 != 0) or year % 400 == 0 else 365
+        for i in range(days):
+            tm = time.localtime(start + i * 86400)
+            yield self.compute_day(tm[0], tm[1], tm[2])
+
+    def year_path(self, year):
+        return f"{self.cache_dir}/{year:04d}.sun"
+
+    def ensure_year(self, year):
+        """Write the year's table unless a matching one for this location is already on flash."""
+        path = self.year_path(year)
+        header = read_header(path)
+        if header and abs(header[3] - self.lat) < 1e-4 and abs(header[4] - self.lng) < 1e-4:
+            return path
+        if self.cache_dir not in os.listdir():
+            os.mkdir(self.cache_dir)
+        if self.table.path == path:
+            self.table.close()
+        write_table(path, year, 0, self.lat, self.lng, self.year_pairs(year), SOURCE_COMPUTED)
+        self.revision += 1
+        try:
+            os.remove(self.year_path(year - 1))
+        except OSError:
+            pass
+        return path
+
+    def day_times(self, year, month, day):
+        """(sunrise, sunset) for a date, read from the year table on flash.
+
+        If the table cannot be written or opened the day is computed directly,
+        and the table is tried again on the next call.
+        """
+        path = self.year_path(year)
+        if self.table.path != path:
+            try:
+                self.ensure_year(year)
+            except OSError as e:
+                print(f"[WARN] Sun table {path} unavailable: {e}")
+        yday = time.localtime(time.mktime((year, month, day, 12, 0, 0, 0, 0)))[7]
+        times = self.table.lookup(path, yday - 1)
+        if self.table.path != path:
+            return self.compute_day(year, month, day)
+        return times
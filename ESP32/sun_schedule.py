@@ -0,0 +1,36 @@
+# sun_schedule.py
+# Today's sunrise/sunset, looked up once per local day and shared by every consumer.
+from time_utils import est_offset_for_date
+
+class SunSchedule:
+    def __init__(self, engine, utc_offset=est_offset_for_date):
+        self.engine = engine
+        self.utc_offset = utc_offset
+        self.year = self.month = self.mday = None
+        self.offset = None
+        self.revision = None
+        self.times = (None, None)
+        self.refreshes = 0
+
+    def invalidate(self):
+        """Force a fresh lookup on the next call, e.g. after the cache was rebuilt."""
+        self.mday = None
+
+    def today(self, now):
+        """(sunrise, sunset) seconds for the local date in now; no I/O unless the day changed."""
+        if (now[2] != self.mday or now[1] != self.month or now[0] != self.year
+                or self.engine.revision != self.revision):
+            self._refresh(now)
+        else:
+            offset = self.utc_offset(now[0], now[1], now[2])
+            if offset != self.offset:
+                self._refresh(now)
+        return self.times
+
+    def _refresh(self, now):
+        self.year, self.month, self.mday = now[0], now[1], now[2]
+        self.offset = self.utc_offset(now[0], now[1], now[2])
+        self.times = self.engine.day_times(now[0], now[1], now[2])
+        # Read after day_times, which may have just written the year table
+        self.revision = self.engine.revision
+        self.refreshes += 1
@@ -0,0 +1,139 @@
+# sun_table.py
+# Fixed-record binary sunrise/sunset tables.
+#
+# Layout: a 20 byte header followed by one 4 byte record per day.
+#   header: magic "SUNT", version, source, year, month (0 = whole year), reserved,
+#           latitude and longitude in 1e-5 degrees, number of days
+#   record: sunrise and sunset as uint16 halves of seconds since local midnight
+#           (2 s resolution), NO_EVENT where the sun does not rise or set,
+#           PENDING in tables still being filled in
+# A year is 20 + 366 * 4 = 1484 bytes.
+import struct
+from config_store import replace_file
+
+MAGIC = b"SUNT"
+VERSION = 1
+HEADER = "<4sBBHBBiiH"
+HEADER_SIZE = 20
+RECORD = "<HH"
+RECORD_SIZE = 4
+NO_EVENT = 0xFFFF
+PENDING = 0xFFFE
+
+SOURCE_COMPUTED = 0
+SOURCE_API = 1
+
+def _pack(rec, rise, sset):
+    struct.pack_into(RECORD, rec, 0,
+                     NO_EVENT if rise is None else rise // 2,
+                     NO_EVENT if sset is None else sset // 2)
+
+def write_table(path, year, month, lat, lng, pairs, source=SOURCE_COMPUTED):
+    """Write (sunrise, sunset) seconds pairs; via a temp file so readers never see a partial table."""
+    tmp = path + ".tmp"
+    rec = bytearray(RECORD_SIZE)
+    days = 0
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER_SIZE))  # placeholder until the day count is known
+        for rise, sset in pairs:
+            _pack(rec, rise, sset)
+            f.write(rec)
+            days += 1
+        f.seek(0)
+        f.write(struct.pack(HEADER, MAGIC, VERSION, source, year, month, 0,
+                            int(lat * 100_000), int(lng * 100_000), days))
+    replace_file(tmp, path)
+    return days
+
+def read_header(path):
+    """(source, year, month, lat, lng, days) or None if the file is missing or not a table."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(data) != HEADER_SIZE:
+        return None
+    magic, version, source, year, month, _, lat, lng, days = struct.unpack(HEADER, data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return source, year, month, lat / 100_000, lng / 100_000, days
+
+def create_pending(path, year, month, lat, lng, days, source=SOURCE_API):
+    """Start a table with every day PENDING, to be filled in by set_day()."""
+    rec = struct.pack(RECORD, PENDING, PENDING)
+    with open(path, "wb") as f:
+        f.write(struct.pack(HEADER, MAGIC, VERSION, source, year, month, 0,
+                            int(lat * 100_000), int(lng * 100_000), days))
+        for _ in range(days):
+            f.write(rec)
+
+def set_day(path, index, rise, sset):
+    """Overwrite one record in place."""
+    rec = bytearray(RECORD_SIZE)
+    _pack(rec, rise, sset)
+    with open(path, "r+b") as f:
+        f.seek(HEADER_SIZE + index * RECORD_SIZE)
+        f.write(rec)
+
+def pending_days(path):
+    """Indexes of days not filled in yet, or None if path is not a readable table."""
+    header = read_header(path)
+    if header is None:
+        return None
+    rec = bytearray(RECORD_SIZE)
+    pending = []
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        for index in range(header[5]):
+            if f.readinto(rec) != RECORD_SIZE:
+                return None
+            if struct.unpack_from(RECORD, rec)[0] == PENDING:
+                pending.append(index)
+    return pending
+
+class SunTable:
+    """Reads single days from table files with one seek and readinto per lookup.
+
+    The file stays open between lookups and the record buffer is preallocated,
+    so a lookup on the same table allocates nothing.
+    """
+    def __init__(self):
+        self.path = None
+        self.file = None
+        self.days = 0
+        self.rec = bytearray(RECORD_SIZE)
+
+    def _open(self, path):
+        if path == self.path:
+            return self.file is not None
+        self.close()
+        header = read_header(path)
+        if header is None:
+            return False  # path stays unset, so the next lookup tries again
+        try:
+            self.file = open(path, "rb")
+        except OSError:
+            return False
+        self.path = path
+        self.days = header[5]
+        return True
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        self.file = None
+        self.path = None
+
+    def lookup(self, path, index):
+        """(sunrise, sunset) seconds for record index, None for missing events; (None, None) if unavailable.
+
+        After a failed open, self.path is not path.
+        """
+        if not self._open(path) or not 0 <= index < self.days:
+            return None, None
+        self.file.seek(HEADER_SIZE + index * RECORD_SIZE)
+        if self.file.readinto(self.rec) != RECORD_SIZE:
+            return None, None
+        rise, sset = struct.unpack_from(RECORD, self.rec)
+        return (None if rise == NO_EVENT else rise * 2, None if sset == NO_EVENT else sset * 2)
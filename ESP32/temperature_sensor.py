@@ -2,6 +2,7 @@ from machine import Pin
 from onewire import OneWire
 from ds18x20 import DS18X20
 import time
+import uasyncio as asyncio
 
 class DS18B20Sensor:
     def __init__(self, data_pin_num, vcc_pin_num=None, resolution=10):
@@ -33,6 +34,12 @@ class DS18B20Sensor:
     def read_fahrenheit(self):
         c = self.read_celsius()
         return self.sensor.fahrenheit(c)
+
+    async def read_fahrenheit_async(self):
+        """Same as read_fahrenheit() but yields to the event loop during the conversion wait."""
+        self.sensor.convert_temp()
+        await asyncio.sleep_ms(200)
+        return self.sensor.fahrenheit(self.sensor.read_temp(self.rom))
     
 if __name__ == "__main__":  
     # Use GPIO13 for data, GPIO12 to power VCC
@@ -30,6 +30,17 @@ def get_est_offset():
     t = time.localtime(time.time())
     return -4 * 3600 if is_dst(t) else -5 * 3600
 
+def est_offset_for_date(year, month, day):
+    """Eastern Time offset in seconds for a calendar date, judged at noon."""
+    t = time.localtime(time.mktime((year, month, day, 12, 0, 0, 0, 0)))
+    return -4 * 3600 if is_dst(t) else -5 * 3600
+
+def format_clock(seconds):
+    """Seconds since midnight as HH:MM:SS, or N/A."""
+    if seconds is None:
+        return "N/A"
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
 def parse_time(time_str):
   try:
     parts = time_str.split()
@@ -48,18 +59,5 @@ def parse_time(time_str):
     return total_seconds
 
   except (ValueError, IndexError) as e:
-    log(f"parsing {time_str} {e}")
+    print(f"parsing {time_str} {e}")
     return None
-
-def today_times(sun_data):
-    now = time.localtime()
-    date_str = f"{now[0]:04d}-{now[1]:02d}-{now[2]:02d}"
-
-    if date_str not in sun_data:
-        return None, None
-
-    sunrise = parse_time(sun_data.get(date_str, {}).get('sunrise', 'N/A'))
-    sunset = parse_time(sun_data[date_str]['sunset'])
-
-    return sunrise, sunset
-
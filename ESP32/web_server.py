@@ -0,0 +1,195 @@
+# web_server.py
+import uasyncio as asyncio
+import sys
+import time
+from http_request import read_request, HttpError, LineReader, MAX_BODY
+
+# Total response bytes written through send(), for /metrics
+bytes_sent = 0
+
+# Prebuilt so shedding load costs one write and no formatting
+BUSY_RESPONSE = b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 5\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+class WebServer:
+    def __init__(self, log, port=80, backlog=5, read_timeout_s=5, request_timeout_s=15, max_body=MAX_BODY,
+                 keep_alive_timeout_s=30, max_requests_per_connection=1000, max_connections=4, rate_limiter=None,
+                 metrics=None):
+        self.log = log
+        self.port = port
+        self.backlog = backlog
+        self.read_timeout_s = read_timeout_s
+        self.request_timeout_s = request_timeout_s
+        self.max_body = max_body
+        # How long an idle persistent connection may wait for its next request,
+        # and how many requests it may carry before the server closes it.
+        self.keep_alive_timeout_s = keep_alive_timeout_s
+        self.max_requests_per_connection = max_requests_per_connection
+        # Admission control, decided per request: with max_connections requests
+        # already in flight, or a client out of rate_limiter tokens, the request
+        # gets BUSY_RESPONSE; priority paths (/ping) skip both. Connections past
+        # max_connections are closed after their current request, and idle
+        # keep-alives only wait read_timeout_s, so idle sockets free up quickly.
+        self.max_connections = max_connections
+        self.rate_limiter = rate_limiter
+        self.priority_paths = ()
+
+        # (method, path) -> (async handler(req, writer), timeout_s)
+        self.routes = {}
+        # async handler(req, writer) for GET/HEAD requests no route matches, e.g. static files
+        self.fallback = None
+
+        self.server = None
+        self.active_connections = 0
+        self.in_flight = 0
+        self.requests_served = 0
+        self.requests_rejected = 0
+        # Liveness, read by the supervisor in-process: these only move when the
+        # server really accepts connections and finishes requests
+        self.connections_accepted = 0
+        self.last_request_ms = None
+
+        # Per-route latency histograms; "static" covers the fallback and "other" 404/405s
+        self.metrics = metrics
+        self.route_latency = {}
+        if metrics:
+            for label in ("static", "other"):
+                self._latency_histogram(label)
+            metrics.collect("http_requests_total", "counter", "Requests handled", lambda: self.requests_served)
+            metrics.collect("http_requests_rejected_total", "counter", "Requests shed by admission control", lambda: self.requests_rejected)
+            metrics.collect("http_connections_active", "gauge", "Open client connections", lambda: self.active_connections)
+            metrics.collect("http_bytes_sent_total", "counter", "Response bytes written", lambda: bytes_sent)
+
+    def route(self, path, handler, methods=("GET",), timeout_s=-1):
+        """Register handler; timeout_s=None lets long-lived streams run without a request deadline."""
+        if timeout_s == -1:
+            timeout_s = self.request_timeout_s
+        for method in methods:
+            self.routes[(method, path)] = (handler, timeout_s)
+        # Long-lived streams would only skew the latency histogram
+        if self.metrics and timeout_s is not None and path not in self.route_latency:
+            self._latency_histogram(path)
+
+    def _latency_histogram(self, label):
+        self.route_latency[label] = self.metrics.histogram(
+            "http_request_duration_ms", "Request handling time by route", f'route="{label}"')
+
+    async def start(self):
+        """Listen on the running uasyncio loop; every connection gets its own task."""
+        self.server = await asyncio.start_server(self._handle_client, "0.0.0.0", self.port, backlog=self.backlog)
+        self.log(f"[INFO] Web server started on port {self.port}")
+
+    def stop(self):
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    async def _handle_client(self, reader, writer):
+        self.active_connections += 1
+        self.connections_accepted += 1
+        peer = writer.get_extra_info("peername")
+        client = peer[0] if peer else None
+        reader = LineReader(reader)
+        try:
+            timeout_s = self.read_timeout_s
+            for remaining in range(self.max_requests_per_connection - 1, -1, -1):
+                try:
+                    req = await asyncio.wait_for(read_request(reader, self.max_body), timeout_s)
+                except HttpError as e:
+                    await send_status(writer, e.status, e.reason)
+                    return
+                if req is None:
+                    return
+                if req.path not in self.priority_paths:
+                    if self.in_flight >= self.max_connections or (self.rate_limiter and not self.rate_limiter.allow(client)):
+                        self.requests_rejected += 1
+                        await send(writer, BUSY_RESPONSE)
+                        return
+                over_capacity = self.active_connections > self.max_connections
+                if not remaining or over_capacity:
+                    req.keep_alive = False
+                self.in_flight += 1
+                try:
+                    await self._dispatch(req, writer)
+                finally:
+                    self.in_flight -= 1
+                self.requests_served += 1
+                self.last_request_ms = time.ticks_ms()
+                if not req.keep_alive:
+                    return
+                # Under pressure an idle keep-alive gets the short read timeout, not the long one
+                timeout_s = self.read_timeout_s if self.active_connections >= self.max_connections else self.keep_alive_timeout_s
+                # Give the control loop a turn between pipelined requests
+                await asyncio.sleep_ms(0)
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            self.log(f"[ERROR] Web request failed: {e}")
+            sys.print_exception(e)
+        finally:
+            self.active_connections -= 1
+            await close_writer(writer)
+
+    async def _dispatch(self, req, writer):
+        start = time.ticks_us()
+        label = req.path
+        handler, timeout_s = self.routes.get((req.method, req.path), (None, self.request_timeout_s))
+        if handler is None and self.fallback and req.method in ("GET", "HEAD"):
+            handler = self.fallback
+            label = "static"
+        if handler is not None:
+            if timeout_s is None:
+                await handler(req, writer)
+                return
+            await asyncio.wait_for(handler(req, writer), timeout_s)
+        else:
+            label = "other"
+            if any(path == req.path for _, path in self.routes):
+                await send_status(writer, 405, "Method Not Allowed", req)
+            else:
+                await send_status(writer, 404, "Not Found", req)
+        if self.metrics:
+            index = self.route_latency.get(label)
+            if index is not None:
+                self.metrics.observe(index, time.ticks_diff(time.ticks_us(), start) / 1000)
+
+async def send(writer, data, timeout_s=None):
+    global bytes_sent
+    if isinstance(data, str):
+        data = data.encode()
+    writer.write(data)
+    bytes_sent += len(data)
+    if timeout_s is None:
+        await writer.drain()
+    else:
+        await asyncio.wait_for(writer.drain(), timeout_s)
+
+async def send_stream(writer, fragments):
+    """Write an iterable of str/bytes fragments one at a time, draining after each."""
+    for fragment in fragments:
+        if fragment:
+            await send(writer, fragment)
+
+def connection_header(req):
+    return "Connection: keep-alive\r\n" if req is not None and req.keep_alive else "Connection: close\r\n"
+
+async def send_response(writer, req, status, body=b"", content_type="text/plain", headers=""):
+    """Send a complete HTTP/1.1 response with Content-Length so the connection can be reused."""
+    if isinstance(body, str):
+        body = body.encode()
+    await send(writer, f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n{headers}{connection_header(req)}\r\n")
+    if body and req.method != "HEAD":
+        await send(writer, body)
+
+async def send_status(writer, status, reason, req=None):
+    """Plain-text status response; without a parsed request the connection is closed."""
+    if req is None:
+        await send(writer, f"HTTP/1.1 {status} {reason}\r\nContent-Type: text/plain\r\nContent-Length: {len(reason)}\r\nConnection: close\r\n\r\n{reason}")
+    else:
+        await send_response(writer, req, f"{status} {reason}", reason)
+
+async def close_writer(writer):
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
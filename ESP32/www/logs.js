@@ -0,0 +1,23 @@
+// Polls /logs for lines newer than the ones rendered into the page and prepends them.
+(function () {
+  var box = document.getElementById("log");
+  if (!box) return;
+  var since = parseInt(box.dataset.since, 10) || 0;
+  function poll() {
+    fetch("/logs?since=" + since + "&limit=50")
+      .then(function (r) { return r.text(); })
+      .then(function (text) {
+        text.split("\n").forEach(function (line) {
+          var sp = line.indexOf(" ");
+          if (sp < 1) return;
+          since = parseInt(line.slice(0, sp), 10);
+          var div = document.createElement("div");
+          div.textContent = line.slice(sp + 1);
+          box.insertBefore(div, box.firstChild);
+        });
+      })
+      .catch(function () {})
+      .then(function () { setTimeout(poll, 5000); });
+  }
+  setTimeout(poll, 5000);
+})();